@@ -0,0 +1,335 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import islice
+import random
+from threading import Lock
+import time
+from sqlalchemy import and_, exists, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from backend import db, cache, events
+from backend.models import ParkingSlot, Reservation
+from backend.migrations import RESERVATION_OVERLAP_CONSTRAINT
+
+
+# how long a lot's index is trusted before it is reloaded from the DB; bookings
+# made by other workers drop it sooner, through the cache's lot:<id> bumps,
+# so this only bounds changes that bypass the ORM
+INDEX_TTL = 300
+
+# reservations in these states no longer hold their slot
+RELEASED_STATUSES = ('cancelled',)
+
+# slots tried by reserve_slot() before giving up under heavy contention
+MAX_CLAIM_ATTEMPTS = 10
+
+# concurrent bookers each pick at random among this many free slots, rather
+# than all racing for the first one
+CANDIDATE_SPREAD = 32
+
+
+class SlotContention(Exception):
+    """Free slots remain, but every claim attempt lost a race for one; the
+    booking can be retried."""
+
+
+class LotIndex:
+    """Interval index of one lot: per slot, the booked time ranges merged
+    into sorted, non-overlapping [start, end) intervals."""
+
+    def __init__(self, location_id, horizon):
+        self.location_id = location_id
+        self.horizon = horizon                  # bookings ending before this were not loaded
+        self.loaded_at = time.monotonic()
+        self.slot_ids = []                      # allocation order
+        self.kinds = {}                         # slot_id -> (vehicle_type_id, is_covered)
+        self.starts = {}
+        self.ends = {}
+
+    def add_slot(self, slot_id, vehicle_type_id=None, is_covered=False):
+        self.slot_ids.append(slot_id)
+        self.kinds[slot_id] = (vehicle_type_id, bool(is_covered))
+        self.starts[slot_id] = []
+        self.ends[slot_id] = []
+
+    def add(self, slot_id, start, end):
+        """Mark [start, end) as booked on the slot, merging with neighbours."""
+        if slot_id not in self.starts:
+            return
+        starts, ends = self.starts[slot_id], self.ends[slot_id]
+
+        # intervals touching [start, end) are the ones in [lo, hi)
+        lo = bisect_left(ends, start)
+        hi = bisect_right(starts, end)
+        if lo < hi:
+            start = min(start, starts[lo])
+            end = max(end, ends[hi - 1])
+        starts[lo:hi] = [start]
+        ends[lo:hi] = [end]
+
+    def is_free(self, slot_id, start, end):
+        """O(log n) check that nothing booked on the slot overlaps [start, end)."""
+        starts, ends = self.starts[slot_id], self.ends[slot_id]
+        i = bisect_left(starts, end)
+        return i == 0 or ends[i - 1] <= start
+
+    def free_slots(self, start, end):
+        return (slot_id for slot_id in self.slot_ids if self.is_free(slot_id, start, end))
+
+    def count_free(self, start, end, vehicle_type_id=None, covered=None):
+        """(free, matching): slots of the wanted kind, and how many of them
+        are free for all of [start, end)."""
+        free = matching = 0
+        for slot_id in self.slot_ids:
+            kind_type, kind_covered = self.kinds[slot_id]
+            if vehicle_type_id is not None and kind_type != vehicle_type_id:
+                continue
+            if covered is not None and kind_covered != covered:
+                continue
+            matching += 1
+            starts = self.starts[slot_id]
+            i = bisect_left(starts, end)
+            if i == 0 or self.ends[slot_id][i - 1] <= start:
+                free += 1
+        return free, matching
+
+    def expired(self):
+        return time.monotonic() - self.loaded_at > INDEX_TTL
+
+
+_indexes = {}
+_lock = Lock()
+# bumped by every invalidate(), so a load that raced one isn't kept
+_epoch = 0
+
+
+def overlap_clause(slot_id, start, end):
+    """Reservations on `slot_id` that hold any part of [start, end)."""
+    return and_(Reservation.slot_id == slot_id,
+                Reservation.status.notin_(RELEASED_STATUSES),
+                Reservation.start_time < end,
+                Reservation.end_time > start)
+
+
+def load_index(location_id):
+    """Build the interval index of a lot with two queries."""
+    return load_indexes([location_id])[location_id]
+
+
+def load_indexes(location_ids):
+    """Build the interval indexes of several lots with two queries in all."""
+    with _lock:
+        epoch = _epoch
+    horizon = datetime.now()
+    indexes = {location_id: LotIndex(location_id, horizon) for location_id in location_ids}
+    if not indexes:
+        return indexes
+
+    slots = (db.session.query(ParkingSlot.location_id, ParkingSlot.slot_id,
+                              ParkingSlot.vehicle_type_id, ParkingSlot.is_covered)
+             .filter(ParkingSlot.location_id.in_(list(indexes)))
+             .order_by(ParkingSlot.slot_id)
+             .all())
+    for location_id, slot_id, vehicle_type_id, is_covered in slots:
+        indexes[location_id].add_slot(slot_id, vehicle_type_id, is_covered)
+
+    bookings = (db.session.query(Reservation.location_id, Reservation.slot_id,
+                                 Reservation.start_time, Reservation.end_time)
+                .filter(Reservation.location_id.in_(list(indexes)),
+                        Reservation.status.notin_(RELEASED_STATUSES),
+                        Reservation.end_time > horizon)
+                .all())
+    for location_id, slot_id, start, end in bookings:
+        indexes[location_id].add(slot_id, start, end)
+
+    with _lock:
+        if _epoch == epoch:
+            _indexes.update(indexes)
+    return indexes
+
+
+def _trusted(index):
+    # other workers' bookings only reach this process as cache tag bumps;
+    # while they can't be received, no index is current
+    return index is not None and not index.expired() and cache.listening()
+
+
+def get_index(location_id):
+    """Return the warm index of a lot, or None when it is cold, expired or
+    can't be kept current."""
+    with _lock:
+        index = _indexes.get(location_id)
+    return index if _trusted(index) else None
+
+
+def get_indexes(location_ids):
+    """Current indexes of the lots, loading every one that isn't trusted in
+    a single batch."""
+    with _lock:
+        indexes = {location_id: _indexes.get(location_id) for location_id in location_ids}
+    cold = [location_id for location_id, index in indexes.items() if not _trusted(index)]
+    indexes.update(load_indexes(cold))
+    return indexes
+
+
+def invalidate(location_id=None):
+    global _epoch
+    with _lock:
+        _epoch += 1
+        if location_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(location_id, None)
+
+
+def _lots_bumped(tags):
+    """Drop the indexes of lots another process changed."""
+    if tags is None:
+        invalidate()
+        return
+    for tag in tags:
+        if tag.startswith("lot:"):
+            invalidate(int(tag[len("lot:"):]))
+
+
+cache.on_bump(_lots_bumped)
+
+
+def record(location_id, slot_id, start, end):
+    """Add a committed booking to the lot's index, if it is warm."""
+    with _lock:
+        index = _indexes.get(location_id)
+        if index is not None:
+            index.add(slot_id, start, end)
+
+
+def free_slot_stmt(location_id, start, end):
+    """Set-based lookup: free slots of the lot for [start, end), in allocation order."""
+    return (select(ParkingSlot.slot_id)
+            .where(ParkingSlot.location_id == location_id,
+                   ~exists().where(overlap_clause(ParkingSlot.slot_id, start, end)))
+            .order_by(ParkingSlot.slot_id))
+
+
+def slot_is_free(slot_id, start, end):
+    return not db.session.query(exists().where(overlap_clause(slot_id, start, end))).scalar()
+
+
+def pick(slot_ids):
+    """One of the first CANDIDATE_SPREAD free slots, at random, or None."""
+    candidates = list(islice(slot_ids, CANDIDATE_SPREAD))
+    return random.choice(candidates) if candidates else None
+
+
+def find_free_slot(location_id, start, end, verify=True):
+    """Return the id of a free slot of the lot for [start, end), or None.
+
+    A warm index answers without touching the DB except for a single check of
+    the chosen slot (skipped with `verify=False` when the caller claims the
+    slot atomically anyway); a cold index, or one that turns out to be stale,
+    falls back to one set-based query and is reloaded for the next booking.
+    """
+    index = get_index(location_id)
+    covered = index is not None and start >= index.horizon
+    candidate = None
+    if covered:
+        candidate = pick(index.free_slots(start, end))
+        if candidate is not None and (not verify or slot_is_free(candidate, start, end)):
+            return candidate
+
+    slot_id = pick(db.session.scalars(free_slot_stmt(location_id, start, end).limit(CANDIDATE_SPREAD)))
+
+    # reload when the index was cold or disagreed with the DB
+    if cache.listening() and (index is None or (covered and (candidate is not None or slot_id is not None))):
+        load_index(location_id)
+    return slot_id
+
+
+def claim_stmt(user_id, location_id, slot_id, vehicle_registration_number, start, end):
+    """INSERT ... SELECT ... WHERE NOT EXISTS claiming the slot for [start, end).
+
+    Returns (statement, values); the statement inserts nothing when the slot
+    is taken and RETURNING gives the new reservation_id otherwise. Usable
+    with a sync or an async session alike.
+    """
+    now = datetime.now()
+    values = {
+        Reservation.user_id: user_id,
+        Reservation.slot_id: slot_id,
+        Reservation.location_id: location_id,
+        Reservation.vehicle_registration_number: vehicle_registration_number,
+        Reservation.start_time: start,
+        Reservation.end_time: end,
+        Reservation.status: Reservation.status.default.arg,
+        Reservation.created_at: now,
+        Reservation.updated_at: now,
+    }
+    candidate = (select(*(literal(value, column.type) for column, value in values.items()))
+                 .where(~exists().where(overlap_clause(slot_id, start, end))))
+    stmt = (insert(Reservation)
+            .from_select([column.key for column in values], candidate)
+            .returning(Reservation.reservation_id))
+    return stmt, {column.key: value for column, value in values.items()}
+
+
+def is_overlap(err):
+    """Whether an IntegrityError is the Postgres overlap constraint firing."""
+    return RESERVATION_OVERLAP_CONSTRAINT in str(err.orig)
+
+
+def claimed(session, reservation_id, values):
+    """Tell the commit hooks about a reservation inserted by claim_stmt(),
+    which bypassed the unit of work."""
+    events.record(session, Reservation(reservation_id=reservation_id, **values), "insert")
+
+
+def claim_slot(user_id, location_id, slot_id, vehicle_registration_number, start, end):
+    """Insert a reservation for the slot unless something already overlaps it.
+
+    The overlap check and the insert are one INSERT ... SELECT ... WHERE NOT
+    EXISTS statement, so two workers can never both claim the same time on a
+    slot; on Postgres, where concurrent statements don't serialize, the
+    reservations_no_overlap constraint settles the race. Returns the new
+    reservation_id, or None when the slot was taken.
+    """
+    stmt, values = claim_stmt(user_id, location_id, slot_id, vehicle_registration_number, start, end)
+    if db.session.get_bind().dialect.name != "postgresql":
+        reservation_id = db.session.execute(stmt).scalar()
+    else:
+        # under READ COMMITTED two claims can both pass NOT EXISTS; the
+        # exclusion constraint rejects the second, inside a savepoint so the
+        # caller's transaction survives it
+        try:
+            with db.session.begin_nested():
+                reservation_id = db.session.execute(stmt).scalar()
+        except IntegrityError as err:
+            if not is_overlap(err):
+                raise
+            reservation_id = None
+    if reservation_id is not None:
+        claimed(db.session, reservation_id, values)
+    return reservation_id
+
+
+def reserve_slot(user_id, location_id, vehicle_registration_number, start, end):
+    """Allocate and atomically claim a slot of the lot for [start, end).
+
+    Returns (reservation_id, slot_id), or None when the lot is full. Losing a
+    race for a slot drops the lot's index and retries with a fresh lookup;
+    raises SlotContention if slots are still free after MAX_CLAIM_ATTEMPTS.
+    """
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        slot_id = find_free_slot(location_id, start, end, verify=False)
+        if slot_id is None:
+            return None
+
+        reservation_id = claim_slot(user_id, location_id, slot_id,
+                                    vehicle_registration_number, start, end)
+        if reservation_id is not None:
+            db.session.commit()
+            record(location_id, slot_id, start, end)
+            return reservation_id, slot_id
+
+        db.session.rollback()
+        invalidate(location_id)
+
+    raise SlotContention(location_id)
@@ -0,0 +1,393 @@
+"""ASGI entry point: async booking and read APIs in front of the Flask app.
+
+    uvicorn backend.asgi:application --workers 4
+
+The hottest routes (POST /reserve, /getlot, /userupcomingbookings,
+/userdashboard, /admindashboard) are served here with async SQLAlchemy
+and an async Redis client, so a process keeps thousands of requests in
+flight while they wait on the database or Redis. They answer exactly like
+their Flask counterparts and reuse the same statements, caches and commit
+hooks. So is /events, whose open streams would otherwise each hold one of
+the WSGI bridge's few worker threads. Every other request, and any other
+method on these paths, falls through to the Flask app, which keeps working
+on its own under run.py.
+"""
+import asyncio, json, os
+from contextlib import asynccontextmanager
+from datetime import datetime
+import anyio
+import jwt
+import redis.asyncio as aioredis
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from backend import app, db, auth, cache, events, occupancy, metrics, push, storage
+from backend.allocation import free_slot_stmt, claim_stmt, claimed, is_overlap, record, invalidate, pick, \
+                               MAX_CLAIM_ATTEMPTS, CANDIDATE_SPREAD
+from backend.cache import versioned_key, cached
+from backend.common import parse_time
+from backend.models import ParkingLocation, ParkingSlot, Reservation
+from backend.routes import build_user_dashboard, lot_rows, lot_occupancy, EVENTS_KEEPALIVE
+
+
+# async driver for each sync backend the app may be configured with
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url):
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+engine = create_async_engine(async_url(db.engine.url), **storage.engine_options(db.engine.url))
+storage.pragmas(engine.sync_engine)
+# commit hooks open sync connections and call sync Redis; commit() runs them
+# in a worker thread instead of on the event loop
+Session = async_sessionmaker(engine, expire_on_commit=False, info={events.DEFER: True})
+
+redis = aioredis.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    decode_responses=True
+)
+
+
+async def in_thread(fn, *args):
+    """Run sync Flask-side code (cache rebuilds, cold loads) off the event loop."""
+    def call():
+        with app.app_context():
+            try:
+                return fn(*args)
+            finally:
+                db.session.remove()
+    return await anyio.to_thread.run_sync(call)
+
+
+async def commit(session):
+    """Commit, then run the commit hooks off the event loop."""
+    await session.commit()
+    committed = events.take_committed(session.sync_session)
+    if committed:
+        await in_thread(events.apply_committed, committed)
+
+
+async def cached_async(namespace, key, loader, ttl=60, tags=()):
+    """cache.cached() without blocking the loop: the in-process tier and Redis
+    are read here, and a miss is rebuilt by cached() in a worker thread."""
+    tags = sorted(tags)
+    versions = cache.known_versions(tags)
+    if versions is None:
+        versions = [int(v or 0) for v in await redis.mget([f"cachetag:{tag}" for tag in tags])]
+    full_key = versioned_key(namespace, key, versions)
+
+    data = cache.local_get(full_key)
+    if data is not None:
+        return data
+    value = await redis.get(full_key)
+    if value is not None:
+        data = json.loads(value)
+        cache.local_set(full_key, data, ttl)
+        return data
+    return await in_thread(lambda: cached(namespace, key, loader, ttl=ttl, tags=tags))
+
+
+async def authenticate(request, session, status=401):
+    """(principal, None) for a valid token cookie, else (None, error response)."""
+    token = request.cookies.get("token")
+    if not token:
+        return None, JSONResponse({"success": False, "message": "Unauthorized User"}, status)
+    try:
+        claims = auth.verify_token(token)
+    except jwt.InvalidTokenError:
+        return None, JSONResponse({"success": False, "message": "Token expired"}, status)
+
+    principal = auth.cached_principal(claims["user_id"])
+    if principal is None:
+        row = (await session.execute(auth.principal_stmt(claims["user_id"]))).first()
+        if row is None:
+            return None, JSONResponse({"success": False, "message": "Couldn't find you in DB"}, status)
+        principal = auth.remember_principal(row)
+    return principal, None
+
+
+# book and reserve the spot
+async def reserve(request):
+    async with Session() as session:
+        principal, denied = await authenticate(request, session, status=402)
+        if denied:
+            return denied
+        try:
+            data = await request.json()
+            start_time = parse_time(data.get("start_time"))
+            end_time = parse_time(data.get("end_time"))
+            vehicle_registration_number = data.get("vehicle_registration_number")
+
+            location_id = (await session.execute(
+                select(ParkingLocation.location_id).where(ParkingLocation.name == data.get("name"))
+            )).scalar()
+            if location_id is None:
+                return JSONResponse({
+                    "success": False,
+                    "message": "Parking lot not found"
+                }, 404)
+
+            # same claim loop as allocation.reserve_slot(), on the set-based lookup
+            for _ in range(MAX_CLAIM_ATTEMPTS):
+                slot_id = pick((await session.execute(
+                    free_slot_stmt(location_id, start_time, end_time).limit(CANDIDATE_SPREAD))).scalars())
+                if slot_id is None:
+                    return JSONResponse({
+                        "success": False,
+                        "message": "No available slot for the selected time range"
+                    }, 402)
+
+                stmt, values = claim_stmt(principal.user_id, location_id, slot_id,
+                                          vehicle_registration_number, start_time, end_time)
+                if engine.dialect.name != "postgresql":
+                    reservation_id = (await session.execute(stmt)).scalar()
+                else:
+                    try:
+                        async with session.begin_nested():
+                            reservation_id = (await session.execute(stmt)).scalar()
+                    except IntegrityError as err:
+                        if not is_overlap(err):
+                            raise
+                        reservation_id = None
+                if reservation_id is not None:
+                    claimed(session.sync_session, reservation_id, values)
+                    await commit(session)
+                    record(location_id, slot_id, start_time, end_time)
+                    return JSONResponse({
+                        "success" : True,
+                        "message" : "Seat reserved successfully",
+                        "reservation_id": reservation_id,
+                    }, 200)
+                await session.rollback()
+                invalidate(location_id)
+
+            # slots are still free, the claims just kept losing races
+            return JSONResponse({
+                "success": False,
+                "message": "Too many bookings for this lot right now, please try again"
+            }, 409)
+
+        except Exception as e:
+            return JSONResponse({
+                "success" : False,
+                "message" : "Internal Server Error (reserve post api)",
+                "error" : str(e)
+            }, 500)
+
+
+async def getlot(request):
+    try:
+        lots = await cached_async("lots", "all", lot_rows, ttl=300, tags=["lots"])
+
+        pipe = redis.pipeline(transaction=False)
+        for lot in lots:
+            pipe.get(occupancy.layout_key(lot["location_id"]))
+            pipe.execute_command("GET", occupancy.bitmap_key(lot["location_id"]), NEVER_DECODE=True)
+        replies = await pipe.execute()
+
+        snapshots = {}
+        for i, lot in enumerate(lots):
+            layout, bitmap = replies[2 * i], replies[2 * i + 1]
+            if layout is None or bitmap is None:
+                snapshots[lot["location_id"]] = await in_thread(occupancy.load, lot["location_id"])
+            else:
+                snapshots[lot["location_id"]] = (json.loads(layout), bitmap)
+
+        return JSONResponse({
+            "success" : True,
+            "message" : "Lot & slots data gathered",
+            "data" : lot_occupancy(lots, snapshots)
+        }, 200)
+
+    except Exception as e:
+        return JSONResponse({
+            "success" : False,
+            "message" : "Internal Server Error",
+            "error" : str(e)
+        }, 500)
+
+
+async def upcoming_bookings(request):
+    async with Session() as session:
+        principal, denied = await authenticate(request, session, status=402)
+        if denied:
+            return denied
+        try:
+            upcoming = (await session.execute(
+                select(ParkingLocation.name, ParkingSlot.slot_number, Reservation.start_time,
+                       Reservation.end_time, Reservation.status)
+                .join(ParkingLocation, ParkingLocation.location_id == Reservation.location_id)
+                .join(ParkingSlot, ParkingSlot.slot_id == Reservation.slot_id)
+                .where(Reservation.user_id == principal.user_id,
+                       Reservation.start_time > datetime.now(),
+                       Reservation.status != 'cancelled')
+                .order_by(Reservation.start_time.asc()))).all()
+
+            return JSONResponse([{
+                "location": b.name,
+                "slot": b.slot_number,
+                "start_time": b.start_time.isoformat(),
+                "end_time": b.end_time.isoformat(),
+                "status": b.status
+            } for b in upcoming], 200)
+
+        except Exception as err:
+            return JSONResponse({
+                "success": False,
+                "message": "Internal Server Error (in upcoming booking api)",
+                "error": str(err)
+            }, 500)
+
+
+async def userdashboard(request):
+    async with Session() as session:
+        principal, denied = await authenticate(request, session)
+        if denied:
+            return denied
+    try:
+        user_id = principal.user_id
+
+        # the entry the Flask route caches
+        data = await cached_async("userdashboard", user_id, lambda: build_user_dashboard(user_id),
+                                  ttl=120, tags=[f"user:{user_id}", "lots"])
+        if data is None:
+            return JSONResponse({"success": False, "message": "Couldn't find you in DB"}, 401)
+        return JSONResponse(data)
+
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e),
+            "message" :"Internal Server Error (in userdashboard route)"
+        }, 500)
+
+
+async def admindashboard(request):
+    try:
+        counters = await redis.hgetall(metrics.METRICS_KEY)
+        if "reconciled_at" in counters:
+            data = metrics.format_metrics(counters)
+        else:
+            data = await in_thread(metrics.admin_metrics)
+
+        return JSONResponse({
+            "success": True,
+            "message": "Admin dashboard metrics fetched successfully",
+            "metrics": data
+        }, 200)
+
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "message": f"Error fetching dashboard metrics: {str(e)}"
+        }, 500)
+
+
+# /events: one Redis subscription per process, fanned out to the open streams
+_streams = set()
+_relay = None
+
+
+async def relay_events():
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(push.EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    event = json.loads(message["data"])
+                    for client in list(_streams):
+                        if not client.wants(event):
+                            continue
+                        try:
+                            client.queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            client.dropped = True
+                            _streams.discard(client)
+        except Exception as err:
+            print("Events subscriber lost:", str(err))
+        await asyncio.sleep(1)
+
+
+async def events_stream(request):
+    async with Session() as session:
+        principal, denied = await authenticate(request, session)
+        if denied:
+            return denied
+    try:
+        types, lots = push.filters(request.query_params.get("types"), request.query_params.get("lots"))
+    except ValueError:
+        return JSONResponse({
+            "success" : False,
+            "message" : "lots must be comma separated lot ids"
+        }, 400)
+
+    global _relay
+    if _relay is None:
+        _relay = asyncio.create_task(relay_events())
+    client = push.Client(types, lots, asyncio.Queue(maxsize=push.CLIENT_QUEUE_SIZE))
+    _streams.add(client)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not client.dropped:
+                try:
+                    event = await asyncio.wait_for(client.queue.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            _streams.discard(client)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# the Flask app sets CORS headers on what it serves; these routes need their own
+cors = [Middleware(CORSMiddleware,
+                   allow_origins=["http://localhost:5173"],
+                   allow_credentials=True,
+                   allow_methods=["GET", "PUT", "POST", "DELETE", "OPTIONS"],
+                   allow_headers=["Content-Type", "Authorization"])]
+
+class AppContext:
+    """Run each request inside a Flask app context, which the commit hooks
+    and the sync fallbacks expect."""
+
+    def __init__(self, asgi_app):
+        self.asgi_app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        with app.app_context():
+            await self.asgi_app(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(application):
+    yield
+    if _relay is not None:
+        _relay.cancel()
+    await engine.dispose()
+    await redis.aclose()
+
+
+application = Starlette(routes=[
+    Route("/reserve", reserve, methods=["POST"], middleware=cors),
+    Route("/getlot", getlot, methods=["GET"], middleware=cors),
+    Route("/userupcomingbookings", upcoming_bookings, methods=["GET"], middleware=cors),
+    Route("/userdashboard", userdashboard, methods=["GET"], middleware=cors),
+    Route("/admindashboard", admindashboard, methods=["GET"], middleware=cors),
+    Route("/events", events_stream, methods=["GET"], middleware=cors),
+    Mount("/", app=WSGIMiddleware(app)),
+], middleware=[Middleware(AppContext)], lifespan=lifespan)
@@ -0,0 +1,168 @@
+"""Authentication of the cookie JWT, shared by every protected route.
+
+A token is verified (HMAC and expiry) once; the claims are then kept in a
+bounded LRU keyed by the token's sha256 until the token's own `exp`, so a
+repeat request skips both the env lookup and the signature check. The
+user behind it is kept as a small read-only Principal, dropped as soon as a
+change to that user commits, so hot authenticated paths make no DB query
+for it either.
+"""
+import hashlib, os, time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from threading import Lock
+import jwt
+from sqlalchemy import select
+from flask import request, jsonify, g
+from backend import db, events
+from backend.models import User
+
+
+# lifetime of issued tokens, matching the cookie's
+TOKEN_LIFETIME = timedelta(minutes=10)
+
+# verified tokens and user principals kept per process
+TOKEN_CACHE_SIZE = 4096
+PRINCIPAL_CACHE_SIZE = 4096
+
+# tokens issued before they carried an exp are trusted this long once verified
+LEGACY_TOKEN_TTL = 600
+
+# a change to a user made by another process is picked up within this many seconds
+PRINCIPAL_TTL = 60
+
+
+Principal = namedtuple("Principal", "user_id username email first_name last_name is_admin")
+
+
+class ExpiringLRU:
+    """Bounded LRU whose entries each carry an absolute expiry (time.time())."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+_tokens = ExpiringLRU(TOKEN_CACHE_SIZE)
+_principals = ExpiringLRU(PRINCIPAL_CACHE_SIZE)
+
+
+def _secret():
+    return os.getenv("JWT_SECRET")
+
+
+def issue_token(user_id):
+    payload = {
+        "user_id": user_id,
+        "exp": datetime.now(timezone.utc) + TOKEN_LIFETIME
+    }
+    return jwt.encode(payload, _secret(), algorithm="HS256")
+
+
+def verify_token(token):
+    """Claims of a valid token; raises jwt.InvalidTokenError otherwise."""
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _tokens.get(key)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, _secret(), algorithms=["HS256"])
+    _tokens.set(key, claims, claims.get("exp", time.time() + LEGACY_TOKEN_TTL))
+    return claims
+
+
+def principal_stmt(user_id):
+    return (select(User.user_id, User.username, User.email,
+                   User.first_name, User.last_name, User.is_admin)
+            .where(User.user_id == user_id))
+
+
+def cached_principal(user_id):
+    return _principals.get(user_id)
+
+
+def remember_principal(row):
+    principal = Principal(*row)
+    _principals.set(principal.user_id, principal, time.time() + PRINCIPAL_TTL)
+    return principal
+
+
+def get_principal(user_id):
+    """The user as a Principal, or None if they no longer exist."""
+    principal = cached_principal(user_id)
+    if principal is not None:
+        return principal
+
+    row = db.session.execute(principal_stmt(user_id)).first()
+    return remember_principal(row) if row is not None else None
+
+
+def current_user():
+    return g.principal
+
+
+def login_required(view=None, *, status=401):
+    """Let the request through only with a valid token cookie of an existing
+    user, available to the view as current_user(). `status` is the code
+    returned otherwise. CORS preflights are passed through untouched."""
+    if view is None:
+        return lambda view: login_required(view, status=status)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == "OPTIONS":
+            return view(*args, **kwargs)
+
+        token = request.cookies.get("token")
+        if not token:
+            return jsonify({"success": False, "message": "Unauthorized User"}), status
+        try:
+            claims = verify_token(token)
+        except jwt.InvalidTokenError:
+            return jsonify({"success": False, "message": "Token expired"}), status
+
+        principal = get_principal(claims["user_id"])
+        if principal is None:
+            return jsonify({"success": False, "message": "Couldn't find you in DB"}), status
+
+        g.principal = principal
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _users_changed(session, obj, op):
+    return [obj.user_id] if isinstance(obj, User) else None
+
+
+def _evict(user_ids):
+    for user_id in set(user_ids):
+        _principals.pop(user_id)
+
+
+events.on_commit(_users_changed, _evict)
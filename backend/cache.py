@@ -1,5 +1,47 @@
+"""Redis cache with namespaced, versioned keys and tag-based invalidation.
+
+A cached value lives under
+
+    cache:v<CACHE_SCHEMA>:<namespace>:<key>@<version of each of its tags>
+
+Committing a change to a model bumps the versions of the tags it touches
+(see _tags_for below), so every entry built from the old data becomes
+unreachable at once and simply expires; no route has to delete keys.
+
+Each process also keeps a small in-memory tier in front of Redis: decoded
+values by versioned key, and the current tag versions, which a background
+subscriber keeps in step with every bump published on INVALIDATION_CHANNEL.
+A hot entry is then served without a network hop. Other in-process state
+can follow the bumps made by other processes through on_bump().
+"""
+import json, os, time
+from collections import Counter, OrderedDict
+from threading import Lock, Thread, Event
+from sqlalchemy import event, inspect
 from backend import redis_client
-import json
+from backend import events
+from backend.models import User, ParkingLocation, ParkingSlot, Reservation, Payment, Review
+
+
+# bump when the shape of cached payloads changes
+CACHE_SCHEMA = 1
+
+# stampede protection: a miss takes a short lock so that only one request
+# rebuilds the entry while the others wait for it
+LOCK_TIMEOUT_MS = 5000
+LOCK_WAIT = 0.05
+LOCK_WAIT_STEPS = 40
+
+# hit/miss counters are flushed to the cache:metrics hash every so many lookups
+METRICS_FLUSH_EVERY = 100
+
+# in-process tier: entries kept per process, and their longest lifetime
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", 1024))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", 60))
+
+# tag bumps are published here as {"<tag>": <new version>, ...}
+INVALIDATION_CHANNEL = "cache:invalidate"
+
 
 def cache_get(key):
     value = redis_client.get(key)
@@ -10,3 +52,294 @@ def cache_set(key, data, ttl=60):
 
 def cache_delete(key):
     redis_client.delete(key)
+
+
+_stats = Counter()
+_stats_lock = Lock()
+
+
+def _count(namespace, outcome):
+    with _stats_lock:
+        _stats[f"{namespace}:{outcome}"] += 1
+        if sum(_stats.values()) < METRICS_FLUSH_EVERY:
+            return
+        flush = dict(_stats)
+        _stats.clear()
+    pipe = redis_client.pipeline(transaction=False)
+    for field, n in flush.items():
+        pipe.hincrby("cache:metrics", field, n)
+    pipe.execute()
+
+
+def cache_stats():
+    """Hit/miss counts per namespace, across all processes."""
+    stats = Counter({field: int(n) for field, n in redis_client.hgetall("cache:metrics").items()})
+    with _stats_lock:
+        stats.update(_stats)
+    return dict(stats)
+
+
+class LocalCache:
+    """Bounded LRU of decoded values, each with its own expiry."""
+
+    def __init__(self, maxsize=LOCAL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = LocalCache()
+
+# tag -> version, trusted only while the subscriber is connected
+_versions = {}
+_versions_lock = Lock()
+_subscribed = Event()
+_subscriber_pid = None
+
+# (tag, version) bumps made by this process whose message hasn't come back yet
+_own_bumps = set()
+
+
+# called with the tags other processes bumped, see on_bump()
+_bump_listeners = []
+
+
+def on_bump(listener):
+    """Call `listener(tags)` with the tags bumped by other processes, as their
+    bumps arrive, and `listener(None)` whenever bumps may have been missed
+    (the subscriber (re)connecting)."""
+    _bump_listeners.append(listener)
+
+
+def _notify(tags):
+    for listener in _bump_listeners:
+        try:
+            listener(tags)
+        except Exception as err:
+            print("Cache bump listener failed:", str(err))
+
+
+def listening():
+    """Whether this process is currently receiving every tag bump."""
+    _ensure_subscriber()
+    return _subscribed.is_set()
+
+
+def _note_versions(versions):
+    # versions only go up; never let a slow MGET overwrite a newer bump
+    with _versions_lock:
+        for tag, version in versions.items():
+            if version > _versions.get(tag, -1):
+                _versions[tag] = version
+
+
+def _received(versions):
+    """Handle one published bump: note it, and tell the listeners unless it
+    was this process's own."""
+    _note_versions(versions)
+    with _versions_lock:
+        remote = [tag for tag, version in versions.items() if (tag, version) not in _own_bumps]
+        _own_bumps.difference_update(versions.items())
+    if remote:
+        _notify(remote)
+
+
+def _listen():
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=False)
+        try:
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    _subscribed.set()
+                    _notify(None)
+                elif message["type"] == "message":
+                    _received({tag: int(v) for tag, v in json.loads(message["data"]).items()})
+        except Exception as err:
+            print("Cache invalidation subscriber lost:", str(err))
+        finally:
+            # bumps may have been missed: stop trusting local versions
+            _subscribed.clear()
+            with _versions_lock:
+                _versions.clear()
+                _own_bumps.clear()
+            pubsub.close()
+        time.sleep(1)
+
+
+def _ensure_subscriber():
+    global _subscriber_pid
+    if _subscriber_pid == os.getpid():
+        return
+    with _versions_lock:
+        if _subscriber_pid == os.getpid():
+            return
+        _subscriber_pid = os.getpid()
+        _versions.clear()
+        _own_bumps.clear()
+    _subscribed.clear()
+    Thread(target=_listen, name="cache-invalidation", daemon=True).start()
+
+
+def known_versions(tags):
+    """The tags' versions as this process's subscriber last saw them, or None
+    when any of them has to be read from Redis."""
+    _ensure_subscriber()
+    if not _subscribed.is_set():
+        return None
+    with _versions_lock:
+        known = [_versions.get(tag) for tag in tags]
+    return None if None in known else known
+
+
+def tag_versions(tags):
+    if not tags:
+        return []
+
+    known = known_versions(tags)
+    if known is not None:
+        return known
+
+    versions = [int(v or 0) for v in redis_client.mget([f"cachetag:{tag}" for tag in tags])]
+    if _subscribed.is_set():
+        _note_versions(dict(zip(tags, versions)))
+    return versions
+
+
+def versioned_key(namespace, key, versions):
+    return f"cache:v{CACHE_SCHEMA}:{namespace}:{key}@{'.'.join(map(str, versions))}"
+
+
+def local_get(full_key):
+    """The in-process copy of a versioned entry, or None."""
+    return _local.get(full_key)
+
+
+def local_set(full_key, data, ttl):
+    _local.set(full_key, data, min(ttl, LOCAL_CACHE_TTL))
+
+
+def cached(namespace, key, loader, ttl=60, tags=()):
+    """Return the cached value for (namespace, key), calling `loader()` to
+    build it on a miss. The entry is dropped whenever one of `tags` is
+    invalidated."""
+    _ensure_subscriber()
+    tags = sorted(tags)
+    full_key = versioned_key(namespace, key, tag_versions(tags))
+    local_ttl = min(ttl, LOCAL_CACHE_TTL)
+
+    # a versioned key never changes content, so the local copy is exact
+    data = _local.get(full_key)
+    if data is not None:
+        _count(namespace, "local_hit")
+        return data
+
+    value = redis_client.get(full_key)
+    if value is not None:
+        _count(namespace, "hit")
+        data = json.loads(value)
+        _local.set(full_key, data, local_ttl)
+        return data
+    _count(namespace, "miss")
+
+    lock_key = f"{full_key}:lock"
+    if not redis_client.set(lock_key, 1, nx=True, px=LOCK_TIMEOUT_MS):
+        # someone else is rebuilding it
+        for _ in range(LOCK_WAIT_STEPS):
+            time.sleep(LOCK_WAIT)
+            value = redis_client.get(full_key)
+            if value is not None:
+                return json.loads(value)
+        return loader()
+
+    try:
+        data = loader()
+        if data is not None:
+            redis_client.setex(full_key, ttl, json.dumps(data))
+            _local.set(full_key, data, local_ttl)
+        return data
+    finally:
+        redis_client.delete(lock_key)
+
+
+def invalidate_tags(tags):
+    tags = set(tags)
+    if not tags:
+        return
+    tags = sorted(tags)
+    pipe = redis_client.pipeline(transaction=False)
+    for tag in tags:
+        pipe.incr(f"cachetag:{tag}")
+    versions = dict(zip(tags, pipe.execute()))
+
+    # this process sees its own writes at once, the others via the channel
+    _note_versions(versions)
+    if _subscribed.is_set():
+        with _versions_lock:
+            _own_bumps.update(versions.items())
+    redis_client.publish(INVALIDATION_CHANNEL, json.dumps(versions))
+
+
+def _values(obj, attr):
+    """The attribute's value, and the one it had before this flush if it changed."""
+    old = inspect(obj).attrs[attr].history.deleted
+    return {getattr(obj, attr), *old} - {None}
+
+
+# the foreign keys whose previous value must be tagged too; active_history
+# makes SQLAlchemy load it before an expired instance is overwritten
+MOVABLE = (Reservation.user_id, Reservation.location_id, ParkingSlot.location_id)
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+for attribute in MOVABLE:
+    event.listen(attribute, "set", _keep_old_value, retval=True, active_history=True)
+
+
+def _tags_for(session, obj, op):
+    """Cache tags made stale by a change to `obj`. A reservation or slot
+    moved to another user or lot also stales the one it left."""
+    if isinstance(obj, Reservation):
+        return ([f"user:{user_id}" for user_id in _values(obj, "user_id")] +
+                [f"lot:{location_id}" for location_id in _values(obj, "location_id")])
+    if isinstance(obj, Payment):
+        reservation = obj.reservation or session.get(Reservation, obj.reservation_id)
+        return [f"user:{reservation.user_id}"] if reservation else None
+    if isinstance(obj, ParkingLocation):
+        return ["lots", f"lot:{obj.location_id}"]
+    if isinstance(obj, ParkingSlot):
+        return [f"lot:{location_id}" for location_id in _values(obj, "location_id")]
+    if isinstance(obj, User):
+        return [f"user:{obj.user_id}"]
+    if isinstance(obj, Review):
+        return ["reviews"]
+    return None
+
+
+events.on_commit(_tags_for, invalidate_tags)
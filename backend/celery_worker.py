@@ -1,4 +1,5 @@
-from backend import celery  
+from backend import celery, storage
+from backend.tasks import reminder, reports, user_report, metrics, rollups, replica
 from celery.schedules import crontab
 
 
@@ -10,5 +11,24 @@ celery.conf.beat_schedule = {
     'monthly-report-task': {
         'task': 'generate_monthly_reports',
         'schedule': crontab(hour=0, minute=0, day_of_month=1), 
+    },
+    'admin-metrics-reconcile-task': {
+        'task': 'reconcile_admin_metrics',
+        'schedule': crontab(minute='*/15'),
+    },
+    'rollups-rebuild-task': {
+        'task': 'rebuild_rollups',
+        'schedule': crontab(hour=0, minute=30),
+        'kwargs': {'days': 3},
+    },
+    'rollups-full-rebuild-task': {
+        'task': 'rebuild_rollups',
+        'schedule': crontab(hour=1, minute=0, day_of_week=0),
+    }
+}
+
+if storage.SNAPSHOT_REPLICA and not storage.REPLICA_URL:
+    celery.conf.beat_schedule['replica-snapshot-task'] = {
+        'task': 'refresh_replica',
+        'schedule': storage.REPLICA_REFRESH,
     }
-}
\ No newline at end of file
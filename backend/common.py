@@ -1,10 +1,9 @@
 import random
-import os
 from datetime import datetime
-import smtplib as smtp
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from smtplib import SMTP, SMTPRecipientsRefused, SMTPAuthenticationError, SMTPException
+from smtplib import SMTPRecipientsRefused, SMTPAuthenticationError, SMTPException
+from backend.mailer import get_pool, SENDER_EMAIL
 
 
 def parse_time(time_str):
@@ -13,11 +12,52 @@ def parse_time(time_str):
     except ValueError:
         return datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S")
 
+# the most slots one lot (one /createlot request) may have
+MAX_LOT_SLOTS = 20000
+
+def expand_slot_layout(layout):
+    """Turn a lot layout spec into ParkingSlot rows (without location_id).
+
+    The spec is a list of ranges, each one
+        {"level": 1, "prefix": "A", "count": 100,        # or "from": 1, "to": 100
+         "covered": true, "vehicle_type_id": 2}
+    and gives slots "L1-A1" .. "L1-A100" ("A1" .. without a level). Only the
+    count (or from/to) is required; the prefix defaults to "S". A layout of
+    more than MAX_LOT_SLOTS slots is refused.
+    """
+    if not isinstance(layout, list):
+        raise ValueError("Layout must be a list of slot ranges")
+
+    slots = []
+    seen = set()
+    for spec in layout:
+        first = int(spec.get("from", 1))
+        last = int(spec["to"]) if "to" in spec else first + int(spec.get("count", 0)) - 1
+        if last < first:
+            raise ValueError("Every slot range needs a positive count or a from/to range")
+        if len(slots) + last - first + 1 > MAX_LOT_SLOTS:
+            raise ValueError(f"A lot can have at most {MAX_LOT_SLOTS} slots")
+
+        prefix = spec.get("prefix", "S")
+        if spec.get("level") is not None:
+            prefix = f"L{spec['level']}-{prefix}"
+
+        for i in range(first, last + 1):
+            slot_number = f"{prefix}{i}"
+            if slot_number in seen:
+                raise ValueError(f"Slot {slot_number} appears twice in the layout")
+            seen.add(slot_number)
+            slots.append({
+                "slot_number": slot_number,
+                "vehicle_type_id": spec.get("vehicle_type_id", 1),
+                "is_covered": bool(spec.get("covered", False))
+            })
+    return slots
+
 def generateOTP():
     return ''.join(str(random.randint(0, 9)) for _ in range(4))
 
 def send_email(email):
-    sender_email = "girmadasingh@gmail.com"
     receiver_email = email
     otp = generateOTP()
 
@@ -26,18 +66,8 @@ def send_email(email):
     text = f"Subject: {subject}\n\n{message}"
 
     try:
-        password = os.getenv('GMAIL_PASSWORD')
-        if not password:
-            print("Pur your password in ENV")
-            raise RuntimeError("Email password not configured in environment.")
-
-        server = smtp.SMTP('smtp.gmail.com', 587)
-        server.starttls()
         # server.set_debuglevel(1)  // check logs 
-        server.login(sender_email, password)
-
-        server.sendmail(sender_email, receiver_email, text)
-        server.quit()
+        get_pool().send(receiver_email, text)
 
         return otp
 
@@ -51,26 +81,20 @@ def send_email(email):
         raise RuntimeError(f"Failed to send email: {str(e)}")
 
 
+def html_email(to_email, subject, html_message):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = to_email
+    msg.attach(MIMEText(html_message, "html"))
+    return msg.as_string()
+
+
 def send_email_html(to_email, subject, html_message):
-    sender_email = "girmadasingh@gmail.com"
     receiver_email = to_email
 
     try:
-        password = os.getenv("GMAIL_PASSWORD")
-        if not password:
-            raise RuntimeError("Email password not configured in environment.")
-
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = sender_email
-        msg["To"] = receiver_email
-        msg.attach(MIMEText(html_message, "html"))
-
-        server = SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
+        get_pool().send(receiver_email, html_email(receiver_email, subject, html_message))
         print(f"Email sent to {receiver_email}")
 
     except SMTPRecipientsRefused:
@@ -79,3 +103,10 @@ def send_email_html(to_email, subject, html_message):
         raise ConnectionError("Authentication failed. Check SMTP credentials.")
     except SMTPException as e:
         raise RuntimeError(f"Failed to send email: {str(e)}")
+
+
+def send_emails_html(messages):
+    """Send [(to_email, subject, html_message), ...] as one batch over the
+    pooled SMTP connections. Returns [(to_email, error)] for failed sends."""
+    return get_pool().send_many(
+        [(to_email, html_email(to_email, subject, html_message)) for to_email, subject, html_message in messages])
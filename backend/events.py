@@ -0,0 +1,123 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# (collect, apply) pairs, see on_commit() and in_transaction()
+_handlers = []
+_tx_handlers = []
+
+
+def on_commit(collect, apply):
+    """Register a hook for committed model changes.
+
+    `collect(session, obj, op)` is called at flush time for every inserted,
+    updated or deleted object (op is "insert", "update" or "delete"), while
+    attribute history is still available, and returns a list of items or
+    None. Once the transaction commits, `apply(items)` is called with all
+    items collected during it; on rollback they are dropped.
+    """
+    _handlers.append((collect, apply))
+
+
+def in_transaction(collect, apply):
+    """Like on_commit(), but `apply(session, items)` runs inside the
+    transaction, at the end of each flush and just before commit, so that
+    whatever it writes commits or rolls back together with the change.
+    """
+    _tx_handlers.append((collect, apply))
+
+
+# session.info flag: keep committed items for take_committed() instead of
+# applying them when the transaction ends
+DEFER = "defer_hooks"
+
+
+def take_committed(session):
+    """The items committed by a session flagged with DEFER, for apply_committed()
+    (e.g. in a worker thread, off an event loop)."""
+    return session.info.pop("deferred_events", [])
+
+
+def apply_committed(batches):
+    for pending in batches:
+        for i, items in pending.items():
+            try:
+                _handlers[i][1](items)
+            except Exception as err:
+                # the commit already happened; a failing hook must not undo the request
+                print("Commit hook failed:", str(err))
+
+
+def record(session, obj, op):
+    """Feed a change made outside the ORM unit of work (a Core INSERT, say)
+    to the hooks, as if `obj` had been flushed."""
+    with session.no_autoflush:
+        for key, handlers in (("pending_events", _handlers), ("pending_tx_events", _tx_handlers)):
+            pending = session.info.setdefault(key, {})
+            for i, (collect, apply) in enumerate(handlers):
+                items = collect(session, obj, op)
+                if items:
+                    pending.setdefault(i, []).extend(items)
+
+
+def add_items(session, apply, items):
+    """Queue `items` for the on_commit() hook whose apply is `apply`, as if
+    its collect had returned them: for a change too large to feed through
+    record() object by object, such as a bulk insert."""
+    for i, (collect, hook_apply) in enumerate(_handlers):
+        if hook_apply is apply:
+            session.info.setdefault("pending_events", {}).setdefault(i, []).extend(items)
+            return
+    raise ValueError(f"{apply!r} is not an on_commit hook")
+
+
+def _apply_in_transaction(session):
+    pending = session.info.pop("pending_tx_events", None)
+    if not pending:
+        return
+    for i, items in pending.items():
+        _tx_handlers[i][1](session, items)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    for op, objs in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objs:
+            if op == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            record(session, obj, op)
+    _apply_in_transaction(session)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_before_commit(session):
+    # changes fed to record() since the last flush
+    _apply_in_transaction(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    # applied once the session has given its connection back to the pool,
+    # so hooks that open their own connection can't exhaust it
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        session.info["committed_events"] = pending
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _apply(session, transaction):
+    if transaction.parent is not None:
+        return
+    pending = session.info.pop("committed_events", None)
+    if not pending:
+        return
+    if session.info.get(DEFER):
+        session.info.setdefault("deferred_events", []).append(pending)
+        return
+    apply_committed([pending])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("pending_events", None)
+    session.info.pop("pending_tx_events", None)
@@ -0,0 +1,167 @@
+import os, time, threading, queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from smtplib import SMTP, SMTPServerDisconnected, SMTPResponseException, SMTPRecipientsRefused, \
+                    SMTPAuthenticationError
+
+
+# SMTP server; point these at a local smtpd/aiosmtpd to test without Gmail
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SENDER_EMAIL = os.getenv("SMTP_SENDER", "girmadasingh@gmail.com")
+
+# open connections kept per process, and messages sent on one before it is recycled
+POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", 100))
+
+# messages per minute across the pool, 0 for no cap
+RATE_PER_MINUTE = int(os.getenv("SMTP_RATE_PER_MINUTE", 0))
+
+# transient failures (dropped connection, 4xx reply) are retried with backoff
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+
+class RateLimiter:
+    """Token bucket refilled at `per_minute` tokens a minute."""
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.per_minute:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * 60 / self.per_minute
+            time.sleep(wait)
+
+
+class SMTPPool:
+    """Persistent, logged-in SMTP connections shared by the sends of a process.
+
+    At most `size` connections are open at once; each one carries up to
+    `per_connection` messages before it is closed and replaced.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS, sender=SENDER_EMAIL,
+                 size=POOL_SIZE, per_connection=MESSAGES_PER_CONNECTION, rate_per_minute=RATE_PER_MINUTE):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.sender = sender
+        self.size = size
+        self.per_connection = per_connection
+        self.limiter = RateLimiter(rate_per_minute)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        password = os.getenv("GMAIL_PASSWORD")
+        if not password and self.host == "smtp.gmail.com":
+            raise RuntimeError("Email password not configured in environment.")
+
+        server = SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if password:
+            server.login(self.sender, password)
+        server.messages_sent = 0
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool unless it failed."""
+        self._slots.acquire()
+        try:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                server = self._connect()
+            try:
+                yield server
+            except SMTPRecipientsRefused:
+                # the session is still good, only that address was rejected
+                self._idle.put(server)
+                raise
+            except Exception:
+                self._close(server)
+                raise
+            server.messages_sent += 1
+            if server.messages_sent >= self.per_connection:
+                self._close(server)
+            else:
+                self._idle.put(server)
+        finally:
+            self._slots.release()
+
+    def send(self, to_email, message):
+        """Send one message (a full RFC 822 string), retrying transient failures."""
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                with self.connection() as server:
+                    server.sendmail(self.sender, to_email, message)
+                return
+            except (SMTPRecipientsRefused, SMTPAuthenticationError):
+                raise
+            except (SMTPServerDisconnected, SMTPResponseException, OSError) as err:
+                transient = not isinstance(err, SMTPResponseException) or 400 <= err.smtp_code < 500
+                if not transient or attempt == MAX_RETRIES:
+                    raise
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    def send_many(self, messages):
+        """Send [(to_email, message), ...] over the pool's connections in parallel.
+
+        Returns [(to_email, error)] for the messages that could not be sent.
+        """
+        def deliver(item):
+            to_email, message = item
+            try:
+                self.send(to_email, message)
+            except Exception as err:
+                return to_email, err
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return [failed for failed in executor.map(deliver, messages) if failed]
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool, recreated after a fork (celery prefork workers)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SMTPPool()
+            _pool_pid = os.getpid()
+        return _pool
@@ -0,0 +1,185 @@
+"""Admin dashboard metrics, kept up to date on every commit.
+
+The counters live in one Redis hash. Each committed change to a user, lot,
+slot, reservation or payment adds its delta to them (see _deltas_for), so
+reading the dashboard is a single HGETALL. reconcile() recomputes them from
+the tables: it runs on a schedule to correct drift from writes that bypass
+the ORM (raw SQL, ON DELETE CASCADE), and whenever the hash is missing.
+"""
+from decimal import Decimal
+from datetime import datetime
+from redis.exceptions import WatchError
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+from backend import db, redis_client, events
+from backend.push import publish
+from backend.models import User, ParkingLocation, ParkingSlot, Reservation, Payment
+
+
+METRICS_KEY = "metrics:admin"
+
+# times reconcile() recounts when deltas land while it counts
+RECONCILE_ATTEMPTS = 5
+
+# reservations in these states count as occupying a slot
+OCCUPYING_STATUSES = ("booked", "occupied")
+
+
+def to_cents(amount):
+    return int(Decimal(str(amount or 0)) * 100)
+
+
+def compute(session=None):
+    """The counters, from six aggregate queries over the tables."""
+    session = session or db.session
+    total_revenue = session.query(func.coalesce(func.sum(Payment.amount), 0)).scalar()
+    return {
+        "total_users": session.query(func.count(User.user_id)).scalar(),
+        "total_reservations": session.query(func.count(Reservation.reservation_id)).scalar(),
+        "total_revenue_cents": to_cents(total_revenue),
+        "active_parking_lots": session.query(func.count(ParkingLocation.location_id))
+                                      .filter(ParkingLocation.is_active == True).scalar(),
+        "total_slots": session.query(func.count(ParkingSlot.slot_id)).scalar(),
+        "occupied_slots": session.query(func.count(Reservation.reservation_id))
+                                 .filter(Reservation.status.in_(OCCUPYING_STATUSES)).scalar(),
+    }
+
+
+def reconcile():
+    """Correct the counters to freshly computed ones; returns how far each
+    counter had drifted, or None when deltas kept arriving and it gave up.
+
+    The correction is applied with HINCRBY, never by overwriting the hash, so
+    it cannot erase a delta, and only if no delta landed while the tables
+    were being counted (WATCH); otherwise it is recomputed. What remains is a
+    commit whose hook has not run yet when the tables are counted: that
+    change is in the count and its delta still arrives.
+    """
+    for _ in range(RECONCILE_ATTEMPTS):
+        with redis_client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(METRICS_KEY)
+                # a session of its own, so each attempt counts the latest rows
+                with Session(db.engine) as session:
+                    counters = compute(session)
+                current = pipe.hgetall(METRICS_KEY)
+                # every counter missing from the hash is written, even at 0
+                corrections = {name: value - int(current.get(name, 0)) for name, value in counters.items()
+                               if name not in current or int(current[name]) != value}
+
+                pipe.multi()
+                for name, correction in corrections.items():
+                    pipe.hincrby(METRICS_KEY, name, correction)
+                pipe.hset(METRICS_KEY, "reconciled_at", datetime.now().isoformat())
+                pipe.execute()
+                if any(corrections.values()):
+                    # live dashboards apply deltas, so they need the correction too
+                    publish("metrics", {name: c for name, c in corrections.items() if c})
+                return {name: -correction for name, correction in corrections.items() if correction}
+            except WatchError:
+                continue
+    return None
+
+
+def admin_metrics():
+    """The dashboard metrics, read from the counters hash."""
+    counters = redis_client.hgetall(METRICS_KEY)
+
+    # deltas applied to a missing hash leave it without reconciled_at
+    if "reconciled_at" not in counters:
+        reconcile()
+        counters = redis_client.hgetall(METRICS_KEY)
+        if "reconciled_at" not in counters:
+            return format_metrics(compute())
+
+    return format_metrics(counters)
+
+
+def format_metrics(counters):
+    """The dashboard metrics from a reconciled counters hash."""
+    total_slots = int(counters["total_slots"])
+    occupied_slots = int(counters["occupied_slots"])
+    return {
+        "total_users": int(counters["total_users"]),
+        "total_reservations": int(counters["total_reservations"]),
+        "total_revenue": int(counters["total_revenue_cents"]) / 100,
+        "active_parking_lots": int(counters["active_parking_lots"]),
+        "total_slots": total_slots,
+        "occupied_slots": occupied_slots,
+        "available_slots": total_slots - occupied_slots if total_slots else 0
+    }
+
+
+def _changed(obj, attr):
+    """(old, new) of an attribute changed in this flush, or None."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _deltas_for(session, obj, op):
+    """(counter, delta) pairs for a change to `obj`."""
+    sign = -1 if op == "delete" else 1
+
+    if isinstance(obj, User):
+        return [("total_users", sign)] if op != "update" else None
+
+    if isinstance(obj, Reservation):
+        occupying = obj.status in OCCUPYING_STATUSES
+        if op != "update":
+            return [("total_reservations", sign)] + ([("occupied_slots", sign)] if occupying else [])
+        status = _changed(obj, "status")
+        if status is None:
+            return None
+        was = status[0] in OCCUPYING_STATUSES
+        return [("occupied_slots", int(occupying) - int(was))] if was != occupying else None
+
+    if isinstance(obj, Payment):
+        if op != "update":
+            return [("total_revenue_cents", sign * to_cents(obj.amount))]
+        amount = _changed(obj, "amount")
+        return [("total_revenue_cents", to_cents(amount[1]) - to_cents(amount[0]))] if amount else None
+
+    if isinstance(obj, ParkingLocation):
+        # total_slots counts slot rows (see ParkingSlot below), not the lot's
+        # own total_slots column, which /editlot can change on its own
+        deltas = []
+        if op != "update":
+            if obj.is_active:
+                deltas.append(("active_parking_lots", sign))
+        else:
+            active = _changed(obj, "is_active")
+            if active and bool(active[0]) != bool(active[1]):
+                deltas.append(("active_parking_lots", 1 if active[1] else -1))
+        return deltas
+
+    if isinstance(obj, ParkingSlot):
+        return [("total_slots", sign)] if op != "update" else None
+
+    return None
+
+
+def apply_deltas(deltas):
+    totals = {}
+    for name, delta in deltas:
+        totals[name] = totals.get(name, 0) + delta
+    totals = {name: delta for name, delta in totals.items() if delta}
+    if not totals:
+        return
+    pipe = redis_client.pipeline(transaction=True)
+    for name, delta in totals.items():
+        pipe.hincrby(METRICS_KEY, name, delta)
+    pipe.execute()
+    publish("metrics", totals)
+
+
+def slots_added(session, count):
+    """Count `count` slots inserted outside the ORM (a bulk insert) once the
+    session commits."""
+    events.add_items(session, apply_deltas, [("total_slots", count)])
+
+
+events.on_commit(_deltas_for, apply_deltas)
@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from backend import db, search
+
+
+# name of the Postgres constraint that keeps bookings of a slot from overlapping
+RESERVATION_OVERLAP_CONSTRAINT = "reservations_no_overlap"
+
+# Postgres only: the booked period as a generated range, and an exclusion
+# constraint so two live reservations of one slot can never overlap, however
+# they were written. Cancelled reservations release their slot.
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    "ALTER TABLE reservations ADD COLUMN IF NOT EXISTS period tsrange "
+    "GENERATED ALWAYS AS (tsrange(start_time, end_time, '[)')) STORED",
+    f"""DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{RESERVATION_OVERLAP_CONSTRAINT}') THEN
+            ALTER TABLE reservations ADD CONSTRAINT {RESERVATION_OVERLAP_CONSTRAINT}
+                EXCLUDE USING gist (slot_id WITH =, period WITH &&) WHERE (status <> 'cancelled');
+        END IF;
+    END $$""",
+]
+
+
+def migrate():
+    """Bring an existing database up to date with the models.
+
+    db.create_all() skips tables that already exist, so indexes added to a
+    model after its table was created are only picked up here.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.begin() as conn:
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+
+    search.install()
@@ -17,23 +17,25 @@ class User(db.Model):
 
     def has_visited_today(self):
         """Check if this user has booked or visited a parking lot today."""
-        from backend.models import ParkingSpot 
-        
-        today = date.today()
-        booking = (ParkingSpot.query
+        from backend.models import Reservation
+
+        start = datetime.combine(date.today(), datetime.min.time())
+        end = start + timedelta(days=1)
+        booking = (Reservation.query
                    .filter_by(user_id=self.user_id)
-                   .filter(db.func.date(ParkingSpot.timestamp) == today)
+                   .filter(((Reservation.created_at >= start) & (Reservation.created_at < end)) |
+                           ((Reservation.start_time >= start) & (Reservation.start_time < end)))
                    .first())
         return booking is not None
     
     def get_most_used_lot(self):
         """Return the name of the most frequently used parking lot by the user."""
-        from backend.models import ParkingSpot, ParkingLocation
-        result = (db.session.query(ParkingLocation.name, db.func.count(ParkingSpot.spot_id))
-                  .join(ParkingLocation, ParkingLocation.location_id == ParkingSpot.location_id)
-                  .filter(ParkingSpot.user_id == self.user_id)
+        from backend.models import Reservation, ParkingLocation
+        result = (db.session.query(ParkingLocation.name, db.func.count(Reservation.reservation_id))
+                  .join(ParkingLocation, ParkingLocation.location_id == Reservation.location_id)
+                  .filter(Reservation.user_id == self.user_id)
                   .group_by(ParkingLocation.name)
-                  .order_by(db.func.count(ParkingSpot.spot_id).desc())
+                  .order_by(db.func.count(Reservation.reservation_id).desc())
                   .first())
         return result[0] if result else "N/A"
 
@@ -48,10 +50,10 @@ class ParkingLocation(db.Model):
     __tablename__ = 'parking_locations'
 
     location_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    name = db.Column(db.String(150), nullable=False)
+    name = db.Column(db.String(150), nullable=False, index=True)
     address_line1 = db.Column(db.String(255), nullable=False)
     address_line2 = db.Column(db.String(255))
-    city = db.Column(db.String(100), nullable=False)
+    city = db.Column(db.String(100), nullable=False, index=True)
     state = db.Column(db.String(100))
     postal_code = db.Column(db.String(20))
     country = db.Column(db.String(100), nullable=False)
@@ -76,10 +78,6 @@ class ParkingSlot(db.Model):
 
     __table_args__ = (db.UniqueConstraint('location_id', 'slot_number', name='unique_slot_per_location'),)
 
-    def is_this_month(self):
-        now = datetime.now()
-        return self.timestamp.year == now.year and self.timestamp.month == now.month
-
 class Reservation(db.Model):
     __tablename__ = 'reservations'
 
@@ -94,7 +92,15 @@ class Reservation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
-    __table_args__ = (db.CheckConstraint('end_time > start_time', name='valid_time_range'),)
+    user = db.relationship('User')
+    slot = db.relationship('ParkingSlot')
+    location = db.relationship('ParkingLocation')
+
+    __table_args__ = (db.CheckConstraint('end_time > start_time', name='valid_time_range'),
+                      db.Index('ix_reservations_slot_time', 'slot_id', 'start_time', 'end_time'),
+                      db.Index('ix_reservations_user_start', 'user_id', 'start_time'),
+                      db.Index('ix_reservations_location_status', 'location_id', 'status'),
+                      db.Index('ix_reservations_status', 'status'))
 
 class Payment(db.Model):
     __tablename__ = 'payments'
@@ -104,9 +110,11 @@ class Payment(db.Model):
     amount = db.Column(db.Numeric(12, 2), nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)
     payment_status = db.Column(db.String(50), nullable=False)
-    payment_date = db.Column(db.DateTime, default=datetime.now)
+    payment_date = db.Column(db.DateTime, default=datetime.now, index=True)
     transaction_id = db.Column(db.String(100))
 
+    reservation = db.relationship('Reservation', backref=db.backref('payment', uselist=False))
+
 class Review(db.Model):
     __tablename__ = 'reviews'
 
@@ -121,6 +129,35 @@ class Review(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'location_id', name='unique_user_review'),
                       db.CheckConstraint('rating BETWEEN 1 AND 5', name='valid_rating_range'))
 
+class DailyLocationStats(db.Model):
+    """Per lot and day: reservations starting that day and payments taken."""
+    __tablename__ = 'daily_location_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('parking_locations.location_id', ondelete='CASCADE'), primary_key=True)
+    reservations = db.Column(db.Integer, nullable=False, default=0)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class DailyPaymentMethodStats(db.Model):
+    """Per payment method and day: payments taken and their total."""
+    __tablename__ = 'daily_payment_method_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class DailyUserStats(db.Model):
+    """Per user and day: reservations starting that day."""
+    __tablename__ = 'daily_user_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    reservations = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_daily_user_stats_user', 'user_id'),)
+
 class OTP(db.Model):
     __tablename__ = 'otp'
 
@@ -131,4 +168,7 @@ class OTP(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
 
-    user = db.relationship('User', backref=db.backref('otp_entries', cascade='all, delete-orphan'))
\ No newline at end of file
+    user = db.relationship('User', backref=db.backref('otp_entries', cascade='all, delete-orphan'))
+
+    # /verify-otp reads a user's latest code
+    __table_args__ = (db.Index('ix_otp_user_created', 'user_id', 'created_at'),)
@@ -0,0 +1,205 @@
+"""Live slot occupancy of every lot, as one Redis bitmap per lot.
+
+Bit i of occupancy:<location_id> is set while the i-th slot of the lot (in
+slot_id order) holds an 'occupied' reservation, i.e. a car is parked in it.
+The order itself is stored next to it as occupancy:<location_id>:layout.
+Both are loaded from the DB on first use and kept current by a commit hook
+that re-checks the slots touched by each reservation or payment change, so
+lot maps can be polled without touching the database.
+
+Writers of a lot bump its occupancy:<location_id>:gen counter before they
+read the DB, and only write if nobody has bumped it since: a load() that
+raced a change is not stored, and a refresh() overtaken by a newer one
+drops the lot for a reload instead of writing older bits over newer ones.
+"""
+import json
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from backend import db, redis_client, events, storage
+from backend.push import publish
+from backend.models import ParkingSlot, Reservation, Payment
+
+
+# the reservation status that marks a slot as taken right now
+OCCUPIED_STATUS = 'occupied'
+
+# a lot's bitmap is reloaded from the DB at least this often (seconds)
+OCCUPANCY_TTL = 3600
+
+
+def bitmap_key(location_id):
+    return f"occupancy:{location_id}"
+
+
+def layout_key(location_id):
+    return f"occupancy:{location_id}:layout"
+
+
+def generation_key(location_id):
+    return f"occupancy:{location_id}:gen"
+
+
+def load(location_id):
+    """Build the lot's layout and bitmap from the DB (two queries) and store
+    them, unless the lot changed meanwhile."""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.watch(generation_key(location_id))
+    try:
+        layout, bitmap = _build(location_id)
+        pipe.multi()
+        pipe.set(layout_key(location_id), json.dumps(layout), ex=OCCUPANCY_TTL)
+        pipe.set(bitmap_key(location_id), bitmap, ex=OCCUPANCY_TTL)
+        pipe.execute()
+    except WatchError:
+        pass                                    # still right for this request, just not stored
+    finally:
+        pipe.reset()
+    return layout, bitmap
+
+
+def _build(location_id):
+    slots = db.session.execute(
+        select(ParkingSlot.slot_id, ParkingSlot.slot_number)
+        .where(ParkingSlot.location_id == location_id)
+        .order_by(ParkingSlot.slot_id)).all()
+    occupied = set(db.session.scalars(
+        select(Reservation.slot_id)
+        .where(Reservation.location_id == location_id, Reservation.status == OCCUPIED_STATUS)))
+
+    bitmap = bytearray((len(slots) + 7) // 8)
+    for i, slot in enumerate(slots):
+        if slot.slot_id in occupied:
+            bitmap[i // 8] |= 0x80 >> (i % 8)       # Redis bit order: MSB first
+    layout = {"slot_ids": [slot.slot_id for slot in slots],
+              "slot_numbers": [slot.slot_number for slot in slots]}
+    return layout, bytes(bitmap)
+
+
+def _bump(location_ids):
+    """Bump the lots' generations; returns {location_id: new generation}."""
+    pipe = redis_client.pipeline(transaction=False)
+    for location_id in location_ids:
+        pipe.incr(generation_key(location_id))
+        pipe.expire(generation_key(location_id), 2 * OCCUPANCY_TTL)
+    return dict(zip(location_ids, pipe.execute()[::2]))
+
+
+def invalidate(location_id):
+    # the bump keeps a load() already reading the old data from storing it
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(layout_key(location_id), bitmap_key(location_id))
+    pipe.incr(generation_key(location_id))
+    pipe.expire(generation_key(location_id), 2 * OCCUPANCY_TTL)
+    pipe.execute()
+
+
+def _write_bits(location_id, generation, bits):
+    """SETBIT the lot's (position, value) bits unless another writer bumped
+    its generation after this one; then the lot is dropped for a reload.
+    Returns the previous bits, or None when dropped."""
+    pipe = redis_client.pipeline(transaction=True)
+    try:
+        pipe.watch(generation_key(location_id))
+        if int(pipe.get(generation_key(location_id)) or 0) != generation:
+            raise WatchError
+        pipe.multi()
+        for i, value in bits:
+            pipe.setbit(bitmap_key(location_id), i, value)
+        return pipe.execute()
+    except WatchError:
+        pipe.reset()
+        invalidate(location_id)
+        return None
+    finally:
+        pipe.reset()
+
+
+def snapshot(location_ids):
+    """{location_id: (layout, bitmap)} for the lots, with one round trip when
+    all of them are warm."""
+    pipe = redis_client.pipeline(transaction=False)
+    for location_id in location_ids:
+        pipe.get(layout_key(location_id))
+        pipe.execute_command("GET", bitmap_key(location_id), NEVER_DECODE=True)
+    replies = pipe.execute()
+
+    lots = {}
+    for i, location_id in enumerate(location_ids):
+        layout, bitmap = replies[2 * i], replies[2 * i + 1]
+        if layout is None or bitmap is None:
+            lots[location_id] = load(location_id)
+        else:
+            lots[location_id] = (json.loads(layout), bitmap)
+    return lots
+
+
+def is_set(bitmap, i):
+    return i // 8 < len(bitmap) and bool(bitmap[i // 8] & (0x80 >> (i % 8)))
+
+
+def occupied_slots(layout, bitmap):
+    """Slot numbers whose bit is set."""
+    return [number for i, number in enumerate(layout["slot_numbers"]) if is_set(bitmap, i)]
+
+
+def _slots_for(session, obj, op):
+    """(location_id, slot_id) whose occupancy a change to `obj` may flip."""
+    if isinstance(obj, Reservation):
+        if op == "update" and not session.is_modified(obj, include_collections=False):
+            return None
+        return [(obj.location_id, obj.slot_id)]
+    if isinstance(obj, Payment):
+        reservation = obj.reservation or session.get(Reservation, obj.reservation_id)
+        return [(reservation.location_id, reservation.slot_id)] if reservation else None
+    if isinstance(obj, ParkingSlot):
+        # the layout itself changed: rebuild the lot on next read
+        return [(obj.location_id, None)]
+    return None
+
+
+def refresh(slots):
+    """Re-check the given slots against the DB and flip their bits."""
+    slots = set(slots)
+    stale_lots = {location_id for location_id, slot_id in slots if slot_id is None}
+    for location_id in stale_lots:
+        invalidate(location_id)
+
+    slots = {(location_id, slot_id) for location_id, slot_id in slots if location_id not in stale_lots}
+    if not slots:
+        return
+
+    # bumped before reading, so a newer reader always holds a newer generation
+    location_ids = sorted({location_id for location_id, _ in slots})
+    generations = _bump(location_ids)
+
+    # the session has just committed and may not emit SQL here
+    with storage.read_engine(db).connect() as conn:
+        occupied = set(conn.scalars(
+            select(Reservation.slot_id)
+            .where(Reservation.slot_id.in_([slot_id for _, slot_id in slots]),
+                   Reservation.status == OCCUPIED_STATUS)
+            .distinct()))
+
+    replies = redis_client.mget([layout_key(location_id) for location_id in location_ids])
+    layouts = {location_id: json.loads(layout) for location_id, layout in zip(location_ids, replies)
+               if layout is not None}             # cold lots are loaded on next read
+
+    for location_id, layout in layouts.items():
+        positions = {slot_id: i for i, slot_id in enumerate(layout["slot_ids"])}
+        changed = [(positions[slot_id], slot_id in occupied) for lot, slot_id in slots
+                   if lot == location_id and slot_id in positions]
+        if not changed:
+            continue
+        previous = _write_bits(location_id, generations[location_id],
+                               [(i, int(now_occupied)) for i, now_occupied in changed])
+        if previous is None:
+            continue
+
+        # tell /events clients about the bits that actually flipped
+        for (i, now_occupied), was in zip(changed, previous):
+            if bool(was) != now_occupied:
+                publish("slot", {"location_id": location_id, "slot_number": layout["slot_numbers"][i],
+                                 "occupied": now_occupied})
+
+
+events.on_commit(_slots_for, refresh)
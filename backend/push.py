@@ -0,0 +1,103 @@
+"""Push of live changes to browsers over Server-Sent Events.
+
+Commit hooks publish small JSON events ({"type": ..., "data": ...}) on the
+EVENTS_CHANNEL Redis channel: slot occupancy flips from backend/occupancy.py
+and metric deltas from backend/metrics.py. Each web process runs a single
+subscriber thread that fans every event out to the in-memory queues of its
+connected /events clients, so an idle client costs one queue and the thread
+serving its response, not a Redis connection. The ASGI entry point
+(backend/asgi.py) serves /events itself, the same way, with an asyncio
+subscriber task and queues.
+"""
+import json, os, queue, threading
+from backend import redis_client
+
+
+EVENTS_CHANNEL = "events"
+
+# events buffered per client; a client that falls further behind is dropped
+# and reconnects through EventSource
+CLIENT_QUEUE_SIZE = 256
+
+
+def publish(event_type, data):
+    redis_client.publish(EVENTS_CHANNEL, json.dumps({"type": event_type, "data": data}))
+
+
+def filters(types, lots):
+    """The event types and lot ids of the ?types=&lots= query parameters, each
+    None when not given; raises ValueError for a lot id that isn't a number."""
+    types = set(filter(None, (types or "").split(","))) or None
+    location_ids = {int(lot) for lot in (lots or "").split(",") if lot} or None
+    return types, location_ids
+
+
+class Client:
+    """One /events connection, optionally restricted to some event types and lots."""
+
+    def __init__(self, types=None, location_ids=None, buffer=None):
+        self.types = types
+        self.location_ids = location_ids
+        self.queue = buffer if buffer is not None else queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.dropped = False
+
+    def wants(self, event):
+        if self.types and event["type"] not in self.types:
+            return False
+        location_id = event["data"].get("location_id")
+        return not (self.location_ids and location_id is not None and location_id not in self.location_ids)
+
+
+class Broker:
+    """Fans the events of one Redis subscription out to the local clients."""
+
+    def __init__(self):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _ensure_listener(self):
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.clients = set()
+        threading.Thread(target=self._listen, name="events-subscriber", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    self._dispatch(json.loads(message["data"]))
+            except Exception as err:
+                print("Events subscriber lost:", str(err))
+            finally:
+                pubsub.close()
+            threading.Event().wait(1)
+
+    def _dispatch(self, event):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            if not client.wants(event):
+                continue
+            try:
+                client.queue.put_nowait(event)
+            except queue.Full:
+                client.dropped = True
+                self.unsubscribe(client)
+
+    def subscribe(self, types=None, location_ids=None):
+        client = Client(types, location_ids)
+        with self.lock:
+            self._ensure_listener()
+            self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+
+broker = Broker()
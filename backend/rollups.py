@@ -0,0 +1,183 @@
+"""Daily rollups of reservations and payments for the admin analytics.
+
+Three tables hold one row per day and lot, payment method or user (see the
+Daily*Stats models). Every flush adds its deltas to them with an upsert in
+the same transaction, so they never disagree with committed data. The cost:
+the upsert locks its (day, lot) and (day, payment method) rows until the
+booking commits, so on Postgres the bookings of one lot for one day, and
+the payments of one method, commit one at a time; SQLite serializes all
+writes anyway.
+
+rebuild() re-derives days from the base tables to undo drift from writes
+that bypass the ORM (raw SQL, ON DELETE cascades). Celery beat runs it
+nightly over the last few days and weekly over all of history, so older
+drift lasts at most a week.
+"""
+from decimal import Decimal
+from sqlalchemy import Date, cast, delete, func, inspect, select, true
+from backend import db, events
+from backend.models import Reservation, Payment, DailyLocationStats, DailyPaymentMethodStats, \
+                           DailyUserStats
+
+
+ROLLUPS = (DailyLocationStats, DailyPaymentMethodStats, DailyUserStats)
+
+# attributes whose change moves a row between buckets or changes its measures
+TRACKED = {
+    Reservation: ("start_time", "location_id", "user_id"),
+    Payment: ("payment_date", "payment_method", "amount", "reservation_id"),
+}
+
+
+def day_of(column):
+    """SQL expression for the calendar day of a datetime column."""
+    if db.engine.dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def month_of(column):
+    """SQL expression for the 'YYYY-MM' month of a datetime column."""
+    if db.engine.dialect.name == "sqlite":
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
+
+def dialect_insert(session, table):
+    """INSERT with on_conflict_do_update() for the session's database."""
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _money(amount):
+    return Decimal(str(amount or 0))
+
+
+def _buckets(session, cls, value):
+    """[(rollup, key, measures)] that one row adds to, reading its attributes
+    through `value(name)`."""
+    if cls is Reservation:
+        day = value("start_time").date()
+        return [(DailyLocationStats, (day, value("location_id")), {"reservations": 1}),
+                (DailyUserStats, (day, value("user_id")), {"reservations": 1})]
+
+    day = value("payment_date").date()
+    amount = _money(value("amount"))
+    buckets = [(DailyPaymentMethodStats, (day, value("payment_method")), {"payments": 1, "revenue": amount})]
+    reservation = session.get(Reservation, value("reservation_id"))
+    if reservation is not None:
+        buckets.append((DailyLocationStats, (day, reservation.location_id), {"payments": 1, "revenue": amount}))
+    return buckets
+
+
+def _deltas_for(session, obj, op):
+    cls = type(obj)
+    if cls not in TRACKED:
+        return None
+
+    state = inspect(obj)
+
+    def current(name):
+        return getattr(obj, name)
+
+    def previous(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(obj, name)
+
+    if op == "update":
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED[cls]):
+            return None
+        removed, added = _buckets(session, cls, previous), _buckets(session, cls, current)
+    elif op == "delete":
+        removed, added = _buckets(session, cls, current), []
+    else:
+        removed, added = [], _buckets(session, cls, current)
+
+    return ([(rollup, key, {m: -v for m, v in measures.items()}) for rollup, key, measures in removed] +
+            added)
+
+
+def apply_deltas(session, deltas):
+    """Upsert the summed deltas, one executemany per rollup table."""
+    totals = {}
+    for rollup, key, measures in deltas:
+        row = totals.setdefault(rollup, {}).setdefault(key, {})
+        for name, value in measures.items():
+            row[name] = row.get(name, 0) + value
+
+    connection = session.connection()
+    for rollup, rows in totals.items():
+        table = rollup.__table__
+        keys = [column.name for column in inspect(rollup).primary_key]
+        measures = [column.name for column in table.columns if column.name not in keys]
+        params = [{**dict(zip(keys, key)), **{name: row.get(name, 0) for name in measures}}
+                  for key, row in rows.items() if any(row.values())]
+        if not params:
+            continue
+
+        stmt = dialect_insert(session, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + stmt.excluded[name] for name in measures})
+        connection.execute(stmt, params)
+
+
+events.in_transaction(_deltas_for, apply_deltas)
+
+
+def rebuild(since=None):
+    """Recompute the rollups for every day from `since` (a date) on, or for
+    all of history, from the base tables, and commit."""
+    session = db.session
+    for rollup in ROLLUPS:
+        stmt = delete(rollup)
+        if since is not None:
+            stmt = stmt.where(rollup.day >= since)
+        session.execute(stmt)
+
+    def window(column):
+        # SQLite needs a WHERE on INSERT ... SELECT ... ON CONFLICT
+        return column >= since if since is not None else true()
+
+    reservation_day = day_of(Reservation.start_time)
+    payment_day = day_of(Payment.payment_date)
+
+    sources = [
+        (DailyLocationStats, ["day", "location_id", "reservations"],
+         select(reservation_day, Reservation.location_id, func.count())
+            .where(window(Reservation.start_time))
+            .group_by(reservation_day, Reservation.location_id)),
+        (DailyUserStats, ["day", "user_id", "reservations"],
+         select(reservation_day, Reservation.user_id, func.count())
+            .where(window(Reservation.start_time))
+            .group_by(reservation_day, Reservation.user_id)),
+        (DailyPaymentMethodStats, ["day", "payment_method", "payments", "revenue"],
+         select(payment_day, Payment.payment_method, func.count(), func.sum(Payment.amount))
+            .where(window(Payment.payment_date))
+            .group_by(payment_day, Payment.payment_method)),
+        (DailyLocationStats, ["day", "location_id", "payments", "revenue"],
+         select(payment_day, Reservation.location_id, func.count(), func.sum(Payment.amount))
+            .join(Reservation, Reservation.reservation_id == Payment.reservation_id)
+            .where(window(Payment.payment_date))
+            .group_by(payment_day, Reservation.location_id)),
+    ]
+    for rollup, columns, source in sources:
+        table = rollup.__table__
+        keys = [column.name for column in inspect(rollup).primary_key]
+        stmt = dialect_insert(session, table).from_select(columns, source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: stmt.excluded[name] for name in columns if name not in keys})
+        session.execute(stmt)
+
+    session.commit()
+
+
+def backfill():
+    """Build the rollups of a database that predates them."""
+    if not any(db.session.query(rollup).first() for rollup in ROLLUPS) and \
+            db.session.query(Reservation).first():
+        rebuild()
@@ -1,23 +1,51 @@
-import re, jwt, os
+import re, os, json, base64, queue
 from dotenv import load_dotenv
-from backend import app, db
-from flask import request, jsonify, make_response, send_file
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from io import BytesIO
+from backend import app, db, redis_client
+from flask import request, jsonify, make_response, send_file, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
-from backend.common import send_email, parse_time
-from sqlalchemy import func
-from backend.models import User, OTP, ParkingLocation, ParkingSlot, Reservation, Review, Payment 
+from backend.common import send_email, parse_time, expand_slot_layout
+from sqlalchemy import func, select, case, insert, and_, or_
+from backend.models import User, OTP, ParkingLocation, ParkingSlot, Reservation, Review, Payment, \
+                           DailyUserStats, DailyPaymentMethodStats
 from datetime import timedelta, datetime
 from sqlalchemy.exc import IntegrityError
-from backend.cache import cache_get, cache_set, cache_delete
+from sqlalchemy.orm import contains_eager
+from backend.cache import cache_set, cached
+from backend.auth import login_required, current_user, issue_token
+from backend.metrics import admin_metrics, slots_added
+from backend import occupancy, push, search
+from backend.storage import replica_reads
+import backend.rollups  # keeps the daily analytics rollups current on commit
+from backend.rollups import month_of
+from backend.user_report import get_report, report_digest, report_path, REPORT_DIR
+from backend.tasks.user_report import build_user_report, job_key, REPORT_JOB_EXPIRES, REPORT_JOB_TIME_LIMIT
+from backend.allocation import reserve_slot, SlotContention, get_indexes as get_lot_indexes, \
+                               invalidate as invalidate_lot_index, RELEASED_STATUSES
 
 load_dotenv()
 
+# /getreservations: rows fetched per round trip when streaming, and the largest page
+RESERVATIONS_CHUNK = 1000
+RESERVATIONS_MAX_PAGE = 1000
+
+# /get-reviews and the /search/* endpoints: default and largest page
+REVIEWS_PAGE_SIZE = 20
+REVIEWS_MAX_PAGE = 100
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 100
+
+# /getusers: default and largest page, and the columns it may return
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE = 500
+USER_FIELDS = ("user_id", "username", "email", "first_name", "last_name", "phone",
+               "is_admin", "created_at", "updated_at")
+
+# report jobs: the history size above which a report is queued at lower priority
+REPORT_LARGE_HISTORY = 500
+
+# /events: seconds between keep-alive comments on an idle stream
+EVENTS_KEEPALIVE = 15
+
 
 # APIs USED BY USERS
 
@@ -165,10 +193,7 @@ def login():
                 }), 402
             
             # generate token
-            payload = {
-                "user_id" : user.user_id
-            }
-            token =  jwt.encode(payload, os.getenv("JWT_SECRET"), algorithm="HS256" )
+            token = issue_token(user.user_id)
 
             response = make_response(
                 jsonify({
@@ -227,11 +252,7 @@ def otp():
             otp_record.is_verified = True
             db.session.commit()
 
-            payload = {
-                "user_id" : user.user_id
-            }
-
-            token =  jwt.encode(payload, os.getenv("JWT_SECRET"), algorithm="HS256" )
+            token = issue_token(user.user_id)
             response = make_response(
                 jsonify({
                 "success" : True,
@@ -256,6 +277,7 @@ def otp():
 
 # book and reserve the spot 
 @app.route("/reserve", methods = ['POST','PUT', 'OPTIONS'] )
+@login_required(status=402)
 def reserve():
     if request.method == 'POST':
         # try:
@@ -324,14 +346,6 @@ def reserve():
                     "success" : False,
                     "message" : "No data retrieved in request"
                 })
-            
-            token = request.cookies.get("token")
-            decoded = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms="HS256")
-            if not decoded or decoded is None:
-                return jsonify({
-                    "success" : False,
-                    "message" : "Token expired"
-                }), 402
 
             print(data)
             name = data.get("name")
@@ -349,50 +363,35 @@ def reserve():
                 }), 402
 
             location = ParkingLocation.query.filter_by(name = name).first()
-            slots = ParkingSlot.query.filter_by(location_id = location.location_id).all()
+            if location is None:
+                return jsonify({
+                    "success": False,
+                    "message": "Parking lot not found"
+                }), 404
 
+            # claim a slot of the lot with nothing booked over
+            # [start_time, end_time); check and insert are a single statement
+            try:
+                claimed = reserve_slot(current_user().user_id, location.location_id,
+                                       vehicle_registration_number, start_time, end_time)
+            except SlotContention:
+                return jsonify({
+                    "success": False,
+                    "message": "Too many bookings for this lot right now, please try again"
+                }), 409
 
-            allocated_slot = None
-            for slot in slots:
-                overlapping = (Reservation.query
-                            .filter(Reservation.slot_id == slot.slot_id)
-                            .filter(
-                                (Reservation.start_time < start_time) &
-                                (Reservation.end_time > end_time)
-                            ).first())
-                
-
-                if not overlapping:
-                    allocated_slot = slot
-                    print("loop break", allocated_slot)
-                    break
-
-            if allocated_slot is None:
+            if claimed is None:
                 return jsonify({
                     "success": False,
                     "message": "No available slot for the selected time range"
                 }), 402
             
-            print("reserve the seat")
-            
-            reservation = Reservation(
-                user_id=decoded['user_id'],
-                slot_id=allocated_slot.slot_id,
-                location_id=allocated_slot.location_id,
-                start_time=start_time,
-                end_time=end_time,
-                vehicle_registration_number=vehicle_registration_number
-            )
-            db.session.add(reservation)
-            db.session.flush()
-            db.session.commit()
-            cache_delete(f"userdashboard:{decoded['user_id']}")
-
-            print("Reservation ID", reservation.reservation_id)
+            reservation_id, slot_id = claimed
+            print("Reservation ID", reservation_id)
             return jsonify({
                 "success" : True,
                 "message" : "Seat reserved successfully",
-                "reservation_id": reservation.reservation_id,
+                "reservation_id": reservation_id,
             }), 200
            
         except Exception as e:
@@ -403,14 +402,6 @@ def reserve():
             }), 500      
     elif request.method == 'PUT':
         try:
-            token = request.cookies.get("token")
-            decoded = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms=["HS256"])
-            if decoded is None:
-                return jsonify({
-                    "success": False,
-                    "message": "Token expired"
-                }), 402
-
             data = request.get_json()
             new_status = data.get("new_status")
             location_name = data.get("location_name")
@@ -419,7 +410,7 @@ def reserve():
             
             location = ParkingLocation.query.filter_by(name = location_name).first()
 
-            reservation = Reservation.query.filter_by(user_id=decoded['user_id'], 
+            reservation = Reservation.query.filter_by(user_id=current_user().user_id, 
                                                       location_id = location.location_id) \
                                             .first()
             
@@ -433,7 +424,8 @@ def reserve():
             reservation.status = new_status
 
             db.session.commit()
-            cache_delete(f"userdashboard:{decoded['user_id']}")
+            if new_status in RELEASED_STATUSES:
+                invalidate_lot_index(location.location_id)
 
             return jsonify({
                 "success": True,
@@ -450,18 +442,26 @@ def reserve():
         return '', 200
     
 # get all the reviews in the DB
+# ?after=<review_id>&limit=<n>: the next page of older reviews, with next_cursor for the one after
 @app.route("/get-reviews", methods = ['GET'] )
 def reviews():
     try:
-        results = db.session.query(
-        User.username,
-        Review.rating,
-        Review.review_text
-        ).join(Review, User.user_id == Review.user_id).all()
+        after = request.args.get("after", type=int)
+        limit = min(max(request.args.get("limit", REVIEWS_PAGE_SIZE, type=int), 1), REVIEWS_MAX_PAGE)
+
+        query = (
+            db.session.query(Review.review_id, User.username, Review.rating, Review.review_text)
+            .join(Review, User.user_id == Review.user_id)
+            .order_by(Review.review_id.desc())
+        )
+        if after is not None:
+            query = query.filter(Review.review_id < after)
+        results = query.limit(limit).all()
 
         reviews = []
-        for username, rating, review_text in results:
+        for review_id, username, rating, review_text in results:
             reviews.append({
+                "review_id": review_id,
                 "username": username,
                 "rating": rating,
                 "review_text": review_text
@@ -469,7 +469,8 @@ def reviews():
 
         return jsonify({
             "success" : True,
-            "data": reviews
+            "data": reviews,
+            "next_cursor": reviews[-1]["review_id"] if len(reviews) == limit else None
         }), 200
     
     except Exception as e:
@@ -478,96 +479,76 @@ def reviews():
             "message" : "Internal server error (get-reviews api)",
             "error" : str(e)
         }), 500
+
+
+# full-text search, best match first
+# ?q=<words>&page=<n>&per_page=<n>; the last word also matches as a prefix
+@app.route("/search/reviews", methods=["GET"])
+def search_reviews():
+    return text_search(search.search_reviews, lambda row: {
+        "review_id": row["review_id"],
+        "username": row["username"],
+        "location": row["location"],
+        "rating": row["rating"],
+        "review_text": row["review_text"]
+    })
+
+@app.route("/search/locations", methods=["GET"])
+def search_locations():
+    return text_search(search.search_locations, lambda row: {
+        "location_id": row["location_id"],
+        "name": row["name"],
+        "address_line1": row["address_line1"],
+        "city": row["city"],
+        "state": row["state"],
+        "postal_code": row["postal_code"],
+        "hourly_rate": float(row["hourly_rate"]),
+        "is_active": bool(row["is_active"])
+    })
+
+def text_search(run, serialize):
+    try:
+        words = search.terms(request.args.get("q"))
+        if not words:
+            return jsonify({"success": False, "message": "Search words are required"}), 400
+
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = min(max(request.args.get("per_page", SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE)
+
+        # one extra row tells whether another page follows
+        rows = run(words, per_page + 1, (page - 1) * per_page)
+
+        return jsonify({
+            "success": True,
+            "message": "Search results" if rows else "No matches",
+            "data": [serialize(row) for row in rows[:per_page]],
+            "page": page,
+            "per_page": per_page,
+            "has_more": len(rows) > per_page
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": "Internal Server Error (search api)",
+            "error": str(e)
+        }), 500
     
 # presenting user dashboard
 @app.route("/userdashboard", methods=["GET"])
+@login_required
 def userdashboard():
         try:
-            token = request.cookies.get("token")
-            print(token)
+            user_id = current_user().user_id
 
-            if not token:
-                return jsonify({"success": False, "message": "Unauthorized User"}), 401
-            
-            decoded = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms="HS256")
-            if not decoded or decoded is None:
-                    return jsonify({
-                        "success" : False,
-                        "message" : "Token expired"
-                    }), 402
-            
-            cache_key = f"userdashboard:{decoded['user_id']}"
-            cache_data = cache_get(cache_key)
-            
-            if cache_data:
-                return jsonify({
-                    "success" : True,
-                    "message": "Dashboard data fetched successfully from REDIS",
-                    "data" : cache_data
-                }), 200
-            
-            user = User.query.filter_by( user_id = decoded['user_id'] ).first()
-            if not user:
+            # rebuilt only after this user's bookings or the lots change
+            data = cached("userdashboard", user_id,
+                          lambda: build_user_dashboard(user_id),
+                          ttl=120, tags=[f"user:{user_id}", "lots"])
+            if data is None:
                 return jsonify({"success": False, "message": "Couldn't find you in DB"}), 401
-            user_id = user.user_id
-
-
-            total_bookings = Reservation.query.filter_by(user_id=user_id).count()
 
-            # Total parked hours (Released bookings only)
-            released_reservations = Reservation.query.filter_by(user_id=user_id, status='available').all()
-            
-            total_seconds = sum((res.end_time - res.start_time).total_seconds() for res in released_reservations)
-            total_hours_parked = round(total_seconds / 3600, 2)
-
-            # Active bookings count (status = "Occupied")
-            active_bookings = Reservation.query.filter_by(user_id=user_id, status='occupied').count()
-
-            # Most visited parking location
-            most_visited = (
-                db.session.query(Reservation.location_id, func.count().label('count'))
-                .filter_by(user_id=user_id)
-                .group_by(Reservation.location_id)
-                .order_by(func.count().desc())
-                .first()
-            )
-
-            location_name = "N/A"
-            if most_visited:
-                location = ParkingLocation.query.get(most_visited.location_id)
-                location_name = location.name if location else "Unknown"
-
-            # Monthly booking count
-            monthly_data = (
-                db.session.query(
-                    func.strftime('%Y-%m', Reservation.start_time).label('month'),
-                    func.count().label('count')
-                )
-                .filter_by(user_id=user_id)
-                .group_by('month')
-                .order_by('month')
-                .all()
-            )
-
-            monthly_chart_data = [{"month": month, "count": count} for month, count in monthly_data]
-
-            cache_set(cache_key, {
-                "first_name": user.first_name,
-                "total_bookings": total_bookings,
-                "total_hours_parked": total_hours_parked,
-                "active_bookings": active_bookings,
-                "most_visited_location": location_name,
-                "monthly_chart_data": monthly_chart_data
-            }, 120)
-
-            return jsonify({
-                "first_name": user.first_name,
-                "total_bookings": total_bookings,
-                "total_hours_parked": total_hours_parked,
-                "active_bookings": active_bookings,
-                "most_visited_location": location_name,
-                "monthly_chart_data": monthly_chart_data
-            })
+            return jsonify(data)
         except Exception as e:
             return jsonify({
                 "success": False, 
@@ -575,179 +556,203 @@ def userdashboard():
                 "message" :"Internal Server Error (in userdashboard route)"
                 }), 500
 
+def build_user_dashboard(user_id):
+    user = User.query.filter_by( user_id = user_id ).first()
+    if not user:
+        return None
+
+    total_bookings = Reservation.query.filter_by(user_id=user_id).count()
+
+    # Total parked hours (Released bookings only)
+    released_reservations = Reservation.query.filter_by(user_id=user_id, status='available').all()
+    
+    total_seconds = sum((res.end_time - res.start_time).total_seconds() for res in released_reservations)
+    total_hours_parked = round(total_seconds / 3600, 2)
+
+    # Active bookings count (status = "Occupied")
+    active_bookings = Reservation.query.filter_by(user_id=user_id, status='occupied').count()
+
+    # Most visited parking location
+    most_visited = (
+        db.session.query(Reservation.location_id, func.count().label('count'))
+        .filter_by(user_id=user_id)
+        .group_by(Reservation.location_id)
+        .order_by(func.count().desc())
+        .first()
+    )
+
+    location_name = "N/A"
+    if most_visited:
+        location = ParkingLocation.query.get(most_visited.location_id)
+        location_name = location.name if location else "Unknown"
+
+    # Monthly booking count
+    monthly_data = (
+        db.session.query(
+            month_of(Reservation.start_time).label('month'),
+            func.count().label('count')
+        )
+        .filter_by(user_id=user_id)
+        .group_by('month')
+        .order_by('month')
+        .all()
+    )
+
+    monthly_chart_data = [{"month": month, "count": count} for month, count in monthly_data]
+
+    return {
+        "first_name": user.first_name,
+        "total_bookings": total_bookings,
+        "total_hours_parked": total_hours_parked,
+        "active_bookings": active_bookings,
+        "most_visited_location": location_name,
+        "monthly_chart_data": monthly_chart_data
+    }
+
 # fetches the user data to display in the dashboard
 @app.route("/userdatadownload", methods=["GET"])
+@login_required
 def download_user_data():
     try:
-        token = request.cookies.get("token")
-        # print(token)
-        if not token:
-            return jsonify({"success": False, "message": "Unauthorized User"}), 401
-                
-        decoded = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms="HS256")
-        if not decoded or decoded is None:
+        user = current_user()
+
+
+        # served from the report store unless something in it changed
+        path = get_report(user)
+
+        return send_file(
+            path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'{user.first_name}_kwikpark_report.pdf'
+        )
+    except Exception as err:
+        return jsonify({
+            "success" : False ,
+            "message" : "Internal Server Error (User data download api)",
+            "error": str(err)
+        }), 500
+
+# queue the user's PDF report on celery instead of building it in the request;
+# identical requests share one job, whose id names the report it will produce
+@app.route("/userdatadownload/jobs", methods=["POST"])
+@login_required
+def enqueue_user_report():
+    try:
+        user = current_user()
+
+        digest = report_digest(user)
+        job_id = f"{user.user_id}-{digest}"
+        if os.path.exists(report_path(user.user_id, digest)):
             return jsonify({
-                "success" : False,
-                "message" : "Token expired"
-            }), 401
-        user = User.query.filter_by( user_id = decoded['user_id'] ).first()
-        # print(user, decoded)
-        if not user:
-            return jsonify({"success": False, "message": "Couldn't find you in DB"}), 401
-        
-        # print("USER", user)
+                "success": True,
+                "message": "Report is ready",
+                "job_id": job_id,
+                "status": "ready"
+            }), 200
 
+        # only the first of several identical requests enqueues the job; the
+        # key lives until the job finishes or could no longer be running
+        if redis_client.set(job_key(job_id), 1, nx=True, ex=REPORT_JOB_EXPIRES + REPORT_JOB_TIME_LIMIT):
+            # short histories are cheap to render, don't queue them behind long ones
+            bookings = Reservation.query.filter_by(user_id=user.user_id).count()
+            priority = 0 if bookings < REPORT_LARGE_HISTORY else 5
+            build_user_report.apply_async(args=[user.user_id], task_id=job_id, priority=priority,
+                                          expires=REPORT_JOB_EXPIRES)
 
-        # Fetching data via ascending order of the start time 
-        reservations = Reservation.query.filter_by(user_id=user.user_id).order_by(Reservation.start_time.desc()).all()
-        
+        return jsonify({
+            "success": True,
+            "message": "Report generation queued",
+            "job_id": job_id,
+            "status": "queued"
+        }), 202
 
-        # print("Reservations", reservations )
+    except Exception as err:
+        return jsonify({
+            "success" : False ,
+            "message" : "Internal Server Error (report job api)",
+            "error": str(err)
+        }), 500
 
+# poll a report job
+@app.route("/userdatadownload/jobs/<job_id>", methods=["GET"])
+@login_required
+def user_report_status(job_id):
+    try:
+        if not re.fullmatch(rf"{current_user().user_id}-[0-9a-f]{{64}}", job_id):
+            return jsonify({"success": False, "message": "Job not found"}), 404
 
-        reviews = Review.query.filter_by(user_id=user.user_id).all()
+        path = report_job_file(job_id)
+        if path:
+            return jsonify({"success": True, "job_id": job_id, "status": "ready"}), 200
 
-        # print("Reviews", reviews)
+        state = build_user_report.AsyncResult(job_id).state
+        if state in ("FAILURE", "REVOKED"):
+            redis_client.delete(job_key(job_id))
+            return jsonify({"success": False, "job_id": job_id, "status": "failed"}), 500
 
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "running" if state == "STARTED" else "queued"
+        }), 200
 
-        # Summarizing
-        total_reservations = len(reservations)
-        total_locations = len(set(r.location_id for r in reservations))
-        total_slots = len(set(r.slot_id for r in reservations))
-        # user_reservations = Reservation.query.filter_by(user_id = user.user_id).all()
-        total_amount = 0
-        for reservation in reservations:
-            # print(reservation)
-            payment = Payment.query.filter_by(reservation_id = reservation.reservation_id).first() # update this 
-            # print(payment)
-            total_amount += payment.amount
-            # print("\n")
-        
-        # print(total_amount, total_locations, total_reservations, total_slots)
+    except Exception as err:
+        return jsonify({
+            "success" : False ,
+            "message" : "Internal Server Error (report job status api)",
+            "error": str(err)
+        }), 500
 
-        total_hours = sum(
-            ((r.end_time - r.start_time).total_seconds() / 3600)
-            for r in reservations
-            if r.start_time and r.end_time
-        )
-        avg_duration = total_hours / total_reservations if total_reservations else 0
-
-        # print("hoga")
-
-        # PDF Setup
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Header
-        header_style = styles["Title"]
-        header = Paragraph("KwikPark - Parking Report", header_style)
-        elements.append(header)
-        elements.append(Spacer(1, 12))
-        elements.append(Paragraph("Contact: support@kwikpark.com", styles["Normal"]))
-        elements.append(Spacer(1, 20))
-
-        # User Info
-        elements.append(Paragraph(f"Name: {user.first_name} {user.last_name}", styles["Heading4"]))
-        elements.append(Paragraph(f"Email: {user.email}", styles["Normal"]))
-        elements.append(Spacer(1, 12))
-
-        # Reservations
-        elements.append(Paragraph("Reservation History", styles["Heading2"]))
-        month_map = {}
-
-        for r in reservations:
-            month = r.start_time.strftime("%B %Y")
-            month_map.setdefault(month, []).append(r)
-
-        for month in sorted(month_map.keys(), reverse=True):
-            elements.append(Paragraph(month, styles["Heading3"]))
-            data = [["Location", "Slot", "In", "Out", "Amount"]]
-            for r in month_map[month]:
-                in_time = r.start_time.strftime("%d %b, %Y %H:%M") if r.start_time else "-"
-                out_time = r.end_time.strftime("%d %b, %Y %H:%M") if r.end_time else "-"
-                location = ParkingLocation.query.get(r.location_id)
-                slot = ParkingSlot.query.get(r.slot_id)
-                payment = Payment.query.filter_by(reservation_id = r.reservation_id).first()
-
-                # print(location, slot, payment)
-
-                data.append([
-                    location.name if location.name else "N/A",
-                    slot.slot_number if slot.slot_number else "N/A",
-                    in_time,
-                    out_time,
-                    f"Rs. {payment.amount:.2f}" if payment.amount else "N/A"
-                ])
-            t = Table(data, hAlign='LEFT')
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                ('GRID', (0, 0), (-1, -1), 1, colors.gray),
-            ]))
-            elements.append(t)
-            elements.append(Spacer(1, 12))
-
-        # Reviews
-        if reviews:
-            elements.append(Paragraph("Reviews", styles["Heading2"]))
-            for r in reviews:
-                elements.append(Paragraph(f"Rating: {r.rating}/5 - {r.review_text}", styles["Normal"]))
-                elements.append(Spacer(1, 6))
-
-        # Summary
-        elements.append(Spacer(1, 24))
-        elements.append(Paragraph("Summary", styles["Heading2"]))
-        summary_data = [
-            ["Total Reservations Made", total_reservations],
-            ["Total Locations Used", total_locations],
-            ["Total Slots Booked", total_slots],
-            ["Average Parking Duration (hrs)", f"{avg_duration:.2f}"],
-            ["Total Amount Paid", f"Rs. {total_amount:.2f}"]
-        ]
-        summary_table = Table(summary_data, hAlign='LEFT')
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(summary_table)
+# download the PDF a finished report job produced
+@app.route("/userdatadownload/jobs/<job_id>/file", methods=["GET"])
+@login_required
+def user_report_file(job_id):
+    try:
+        if not re.fullmatch(rf"{current_user().user_id}-[0-9a-f]{{64}}", job_id):
+            return jsonify({"success": False, "message": "Job not found"}), 404
 
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
+        path = report_job_file(job_id)
+        if not path:
+            return jsonify({"success": False, "message": "Report is not ready yet"}), 409
 
         return send_file(
-            buffer,
+            path,
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=f'{user.first_name}_kwikpark_report.pdf'
+            download_name='kwikpark_report.pdf'
         )
+
     except Exception as err:
         return jsonify({
             "success" : False ,
-            "message" : "Internal Server Error (User data download api)",
+            "message" : "Internal Server Error (report file api)",
             "error": str(err)
         }), 500
 
+def report_job_file(job_id):
+    """Path of the PDF a job produced, or None while it has not."""
+    user_id, digest = job_id.split("-", 1)
+    path = report_path(user_id, digest)
+    if os.path.exists(path):
+        return path
+
+    # the data changed while the job ran: it built a newer report instead
+    result = build_user_report.AsyncResult(job_id)
+    if result.state == "SUCCESS":
+        path = os.path.join(REPORT_DIR, os.path.basename(result.result))
+        if os.path.exists(path):
+            return path
+    return None
+
 # fetches the upcoming bookings for a user to display 
 # in the dashboard
 @app.route('/userupcomingbookings', methods=['GET'])
+@login_required(status=402)
 def get_upcoming_bookings():
     try:
-        token = request.cookies.get("token")
-        if not token:
-            return jsonify({"success": False, "message": "Unauthorized User"}), 402
-                
-        decoded = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms="HS256")
-        if not decoded or decoded is None:
-            return jsonify({
-                "success" : False,
-                "message" : "Token expired"
-            }), 401
-        user = User.query.filter_by( user_id = decoded['user_id'] ).first()
-        if not user:
-            return jsonify({"success": False, "message": "Couldn't find you in DB"}), 401
-        
+        user = current_user()
+
         now = datetime.now()
 
         upcoming = Reservation.query.filter(
@@ -813,7 +818,6 @@ def create_payment():
 
         db.session.add(new_payment)
         db.session.commit()
-        cache_delete(f"userdashboard:{Reservation.user_id}")
 
         return jsonify({
             "success": True,
@@ -848,6 +852,17 @@ def clot():
                     "message" : "No data retrieved in request"
                 }),401
             
+            # slots come from the layout spec if given, else S1..S<total_slots>
+            try:
+                total_slots = int(data.get("total_slots") or 0)
+                layout = data.get("layout") or ([{"count": total_slots}] if total_slots else [])
+                slots = expand_slot_layout(layout)
+            except (ValueError, TypeError, KeyError) as err:
+                return jsonify({
+                    "success" : False,
+                    "message" : f"Invalid slot layout: {err}"
+                }),400
+
             new_location = ParkingLocation(
                     name = data.get("name"),
                     address_line1 = data.get("address_line1"),
@@ -857,7 +872,7 @@ def clot():
                     postal_code = data.get("postal_code"),
                     country = data.get("country"),
                     phone = data.get("phone"),
-                    total_slots = data.get("total_slots"),
+                    total_slots = len(slots),
                     hourly_rate = data.get("hourly_rate"),
                     is_active = data.get("is_active")
                 )
@@ -865,18 +880,22 @@ def clot():
             db.session.add(new_location)
             db.session.flush()
 
-
-            
-            for i in range(1, new_location.total_slots + 1):
-                slot = ParkingSlot(slot_number=f"S{i}", vehicle_type_id = 1, location_id=new_location.location_id, is_covered=0)
-                db.session.add(slot)
+            # one executemany INSERT for all slots, no per-object unit of work
+            for slot in slots:
+                slot["location_id"] = new_location.location_id
+            if slots:
+                db.session.execute(insert(ParkingSlot), slots)
+                # the bulk insert bypassed the unit of work; count its slots
+                slots_added(db.session, len(slots))
             db.session.commit()
 
             return jsonify({
                 "success" : True,
-                "message" : "Lot created successfully"
+                "message" : "Lot created successfully",
+                "total_slots" : len(slots)
             }),200
         except Exception as e:
+            db.session.rollback()
             return jsonify({
                 "success" : False,
                 "message" : "Internal Server Error (create-lot api)"
@@ -982,8 +1001,6 @@ def dlot():
             db.session.delete(lot)
             db.session.commit()
 
-            cache_delete("admindashboard:Girmada")
-
             return jsonify({
                 "success" : True,
                 "message" : "Lot deleted successfully"
@@ -1001,54 +1018,14 @@ def dlot():
 @app.route("/getlot", methods = ['GET'])
 def glot():
     try:
-        results = (
-            db.session.query(
-                ParkingLocation.name.label("lot_name"),
-                ParkingLocation.city,
-                ParkingLocation.country,
-                ParkingLocation.state,
-                ParkingLocation.postal_code,
-                ParkingLocation.total_slots,
-                ParkingLocation.hourly_rate,
-                func.group_concat(ParkingSlot.slot_number).label("occupied_slots")
-            )
-            .outerjoin(
-                ParkingSlot, 
-                (ParkingSlot.location_id == ParkingLocation.location_id) &
-                (ParkingSlot.is_covered == 1))
-            .outerjoin(
-                Reservation,
-                (Reservation.slot_id == ParkingSlot.slot_id) &
-                (Reservation.status == 'occupied')
-            )
-            .group_by(
-                ParkingLocation.name,
-                ParkingLocation.city,
-                ParkingLocation.country,
-                ParkingLocation.state,
-                ParkingLocation.postal_code,
-                ParkingLocation.total_slots,
-                ParkingLocation.hourly_rate
-            )
-            .all()
-        )
-        location_slots = {}
-
-        for row in results:
-            location_slots[row.lot_name] = {
-                "city": row.city,
-                "country": row.country,
-                "state": row.state,
-                "postal_code": row.postal_code,
-                "total_slots": row.total_slots,
-                "hourly_rate": float(row.hourly_rate),
-                "occupied_slots": row.occupied_slots.split(",") if row.occupied_slots else []
-            }
+        # lot details change rarely; occupancy comes from the live bitmaps
+        lots = cached("lots", "all", lot_rows, ttl=300, tags=["lots"])
+        snapshots = occupancy.snapshot([lot["location_id"] for lot in lots])
 
         return jsonify({
                     "success" : True,
                     "message" : "Lot & slots data gathered",
-                    "data" : location_slots
+                    "data" : lot_occupancy(lots, snapshots)
             }), 200
     
     except Exception as e:
@@ -1057,37 +1034,219 @@ def glot():
             "message" : "Internal Server Error",
             "error" : str(e)
         }), 500
-        
-# get all users
-@app.route("/getusers", methods = ['GET'])
-def gusers():
+
+def lot_occupancy(lots, snapshots):
+    """The /getlot data: each lot (from lot_rows()) with its occupied slots,
+    given {location_id: (layout, bitmap)}."""
+    location_slots = {}
+    for lot in lots:
+        layout, bitmap = snapshots[lot["location_id"]]
+        location_slots[lot["lot_name"]] = {
+            "location_id": lot["location_id"],
+            "city": lot["city"],
+            "country": lot["country"],
+            "state": lot["state"],
+            "postal_code": lot["postal_code"],
+            "total_slots": lot["total_slots"],
+            "hourly_rate": lot["hourly_rate"],
+            "occupied_slots": occupancy.occupied_slots(layout, bitmap)
+        }
+    return location_slots
+
+def lot_rows():
+    return [{
+        "location_id": row.location_id,
+        "lot_name": row.name,
+        "city": row.city,
+        "country": row.country,
+        "state": row.state,
+        "postal_code": row.postal_code,
+        "total_slots": row.total_slots,
+        "hourly_rate": float(row.hourly_rate),
+        "is_active": row.is_active
+    } for row in db.session.query(
+        ParkingLocation.location_id,
+        ParkingLocation.name,
+        ParkingLocation.city,
+        ParkingLocation.country,
+        ParkingLocation.state,
+        ParkingLocation.postal_code,
+        ParkingLocation.total_slots,
+        ParkingLocation.hourly_rate,
+        ParkingLocation.is_active
+    ).order_by(ParkingLocation.location_id).all()]
+
+# free slots per lot for a time window, cheapest lots first
+# query params: start_time, end_time, and city or lots (comma separated location ids);
+# optional: vehicle_type_id, covered (true/false), limit
+@app.route("/search/availability", methods = ['GET'])
+def search_availability():
     try:
-        users = User.query.all()
+        args = request.args
+        try:
+            start_time = parse_time(args["start_time"])
+            end_time = parse_time(args["end_time"])
+            wanted = {int(lot) for lot in args.get("lots", "").split(",") if lot}
+            vehicle_type_id = args.get("vehicle_type_id", type=int)
+            covered = {"true": True, "false": False}[args["covered"].lower()] if "covered" in args else None
+        except (KeyError, ValueError, TypeError) as err:
+            return jsonify({
+                "success" : False,
+                "message" : f"Invalid search parameters: {err}"
+            }), 400
 
-        if len(users) == 0:
+        city = args.get("city")
+        if end_time <= start_time or not (city or wanted):
             return jsonify({
                 "success" : False,
-                "message"  : "No data available"
+                "message" : "Give a city or lots, and an end_time after start_time"
+            }), 400
+
+        # only the part of the window still ahead can be booked
+        start_time = max(start_time, datetime.now())
+        if end_time <= start_time:
+            return jsonify({"success": True, "message": "Window is in the past", "data": []}), 200
+
+        lots = [lot for lot in cached("lots", "all", lot_rows, ttl=300, tags=["lots"])
+                if lot["is_active"] is not False
+                and (not city or lot["city"] == city)
+                and (not wanted or lot["location_id"] in wanted)]
+        indexes = get_lot_indexes([lot["location_id"] for lot in lots])
+
+        results = []
+        for lot in lots:
+            free, matching = indexes[lot["location_id"]].count_free(start_time, end_time, vehicle_type_id, covered)
+            results.append({
+                "location_id": lot["location_id"],
+                "name": lot["lot_name"],
+                "city": lot["city"],
+                "hourly_rate": lot["hourly_rate"],
+                "matching_slots": matching,
+                "free_slots": free
             })
+        results.sort(key=lambda r: (r["free_slots"] == 0, r["hourly_rate"], -r["free_slots"]))
+
+        limit = args.get("limit", type=int)
+        return jsonify({
+            "success" : True,
+            "message" : "Availability fetched",
+            "data" : results[:limit] if limit else results
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success" : False,
+            "message" : "Internal Server Error (availability search api)",
+            "error" : str(e)
+        }), 500
+
+# live updates over Server-Sent Events
+# optional query params: types (comma separated, e.g. slot,metrics), lots (comma separated location ids)
+@app.route("/events", methods = ['GET'])
+@login_required
+def events_stream():
+    try:
+        types, lots = push.filters(request.args.get("types"), request.args.get("lots"))
+    except ValueError:
+        return jsonify({
+            "success" : False,
+            "message" : "lots must be comma separated lot ids"
+        }), 400
+
+    client = push.broker.subscribe(types, lots)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not client.dropped:
+                try:
+                    event = client.queue.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            push.broker.unsubscribe(client)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# live availability of one lot
+# bitmap: base64 of the occupancy bits, one per slot in "slots" order, MSB first
+@app.route("/lots/<int:location_id>/availability", methods = ['GET'])
+def lot_availability(location_id):
+    try:
+        layout, bitmap = occupancy.snapshot([location_id])[location_id]
+        if not layout["slot_ids"] and db.session.get(ParkingLocation, location_id) is None:
+            return jsonify({
+                "success" : False,
+                "message" : "Lot not found"
+            }), 404
+
+        occupied = occupancy.occupied_slots(layout, bitmap)
+        return jsonify({
+            "success" : True,
+            "message" : "Lot availability fetched",
+            "data" : {
+                "location_id": location_id,
+                "total_slots": len(layout["slot_ids"]),
+                "occupied": len(occupied),
+                "available": len(layout["slot_ids"]) - len(occupied),
+                "slots": layout["slot_numbers"],
+                "occupied_slots": occupied,
+                "bitmap": base64.b64encode(bitmap).decode()
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success" : False,
+            "message" : "Internal Server Error (lot availability api)",
+            "error" : str(e)
+        }), 500
         
+# get users, a keyset page at a time
+# ?after=<user_id>&limit=<n>: the page after that user, with next_cursor for the next one
+# ?q=<prefix>: only users whose username or email starts with it (case-sensitive)
+# ?fields=username,email,...: only these columns (user_id is always included)
+@app.route("/getusers", methods = ['GET'])
+@replica_reads
+def gusers():
+    try:
+        after = request.args.get("after", type=int)
+        limit = min(max(request.args.get("limit", USERS_PAGE_SIZE, type=int), 1), USERS_MAX_PAGE)
+        prefix = request.args.get("q", "").strip()
+
+        fields = request.args.get("fields")
+        fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(USER_FIELDS)
+        unknown = [f for f in fields if f not in USER_FIELDS]
+        if unknown:
+            return jsonify({
+                "success" : False,
+                "message"  : f"Unknown fields: {', '.join(unknown)}"
+            }), 400
+        if "user_id" not in fields:
+            fields.insert(0, "user_id")
+
+        query = select(*(getattr(User, f) for f in fields)).order_by(User.user_id).limit(limit)
+        if after is not None:
+            query = query.where(User.user_id > after)
+        if prefix:
+            # ranges rather than LIKE, so the unique indexes on both columns serve them
+            query = query.where(or_(prefix_range(User.username, prefix), prefix_range(User.email, prefix)))
+
         user_list = []
-        for user in users:
-            user_list.append({
-                "user_id": user.user_id,
-                "username": user.username,
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "phone": user.phone,
-                "is_admin": user.is_admin,
-                "created_at": user.created_at.isoformat(),
-                "updated_at": user.updated_at.isoformat()
-            })
+        for row in db.session.execute(query):
+            user = {}
+            for f, value in zip(fields, row):
+                user[f] = value.isoformat() if isinstance(value, datetime) else value
+            user_list.append(user)
 
         return jsonify({
             "success" : True,
-            "message"  : "User data gathered",
-            "data" : user_list
+            "message"  : "User data gathered" if user_list else "No data available",
+            "data" : user_list,
+            "next_cursor": user_list[-1]["user_id"] if len(user_list) == limit else None
         }), 200
     
     except Exception as e:
@@ -1097,45 +1256,63 @@ def gusers():
             "error"  : str(e)
         }), 500
 
+def prefix_range(column, prefix):
+    """column starts with prefix, as a [prefix, next prefix) range."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
 # get all reservation data
+# default: the full list, streamed as one JSON document
+# ?after=<reservation_id>&limit=<n>: keyset page, with next_cursor for the next one
+# ?format=ndjson: one reservation per line, streamed
 @app.route("/getreservations", methods = ['GET'])  
+@replica_reads
 def greservations():
     try:
-        reservations = (
-            db.session.query(Reservation)
-            .join(User, Reservation.user_id == User.user_id)
-            .join(ParkingLocation, Reservation.location_id == ParkingLocation.location_id)
-            .join(ParkingSlot, Reservation.slot_id == ParkingSlot.slot_id)
-            .all()
+        after = request.args.get("after", type=int)
+        limit = request.args.get("limit", type=int)
+        fmt = request.args.get("format")
+
+        # user, lot and slot come from the same joined query
+        query = (
+            select(Reservation)
+            .join(Reservation.user)
+            .join(Reservation.location)
+            .join(Reservation.slot)
+            .options(contains_eager(Reservation.user),
+                     contains_eager(Reservation.location),
+                     contains_eager(Reservation.slot))
+            .order_by(Reservation.reservation_id)
         )
+        if after is not None:
+            query = query.where(Reservation.reservation_id > after)
 
-        result = []
-        for r in reservations:
-            user = User.query.get(r.user_id)
-            slot = ParkingSlot.query.get(r.slot_id)
-            location = ParkingLocation.query.get(r.location_id)
+        if limit is not None:
+            limit = min(max(limit, 1), RESERVATIONS_MAX_PAGE)
+            page = [reservation_row(r) for r in db.session.scalars(query.limit(limit))]
+            return jsonify({
+                "success": True,
+                "message": "Reservations fetched successfully",
+                "reservations": page,
+                "next_cursor": page[-1]["reservation_id"] if len(page) == limit else None
+            }), 200
 
-            result.append({
-                "reservation_id": r.reservation_id,
-                "user": {
-                    "user_id": user.user_id,
-                    "username": user.username,
-                    "email": user.email
-                } if user else None,
-                "lot": location.name if location else None,
-                "slot": slot.slot_number if slot else None,
-                "status": r.status,
-                "vehicle_registration_number": r.vehicle_registration_number,
-                "start_time": r.start_time.isoformat(),
-                "end_time": r.end_time.isoformat()
-            })
+        rows = db.session.scalars(query.execution_options(yield_per=RESERVATIONS_CHUNK))
 
+        if fmt == "ndjson":
+            def generate():
+                for r in rows:
+                    yield json.dumps(reservation_row(r)) + "\n"
 
-        return jsonify({
-            "success": True,
-            "message": "Reservations fetched successfully",
-            "reservations": result
-        }), 200
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        def generate():
+            yield '{"success": true, "message": "Reservations fetched successfully", "reservations": ['
+            for i, r in enumerate(rows):
+                yield ("," if i else "") + json.dumps(reservation_row(r))
+            yield ']}'
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
 
     except Exception as e:
         return jsonify({
@@ -1144,40 +1321,29 @@ def greservations():
             "error": str(e)
         }), 500
 
+def reservation_row(r):
+    return {
+        "reservation_id": r.reservation_id,
+        "user": {
+            "user_id": r.user.user_id,
+            "username": r.user.username,
+            "email": r.user.email
+        },
+        "lot": r.location.name,
+        "slot": r.slot.slot_number,
+        "status": r.status,
+        "vehicle_registration_number": r.vehicle_registration_number,
+        "start_time": r.start_time.isoformat(),
+        "end_time": r.end_time.isoformat()
+    }
+
 # get overall metrics 
 @app.route("/admindashboard", methods = ["GET"])  
 def admindashboard():
     try:
 
-        cache_key = f"admindashboard:Girmada"
-        cache_data = cache_get(cache_key)
-        if cache_data:
-            return jsonify({
-                "success": True,
-                "message" : "Data fetched successfully from REDIS",
-                "metrics" : cache_data
-            }), 200
-
-        total_users = db.session.query(func.count(User.user_id)).scalar()
-        total_reservations = db.session.query(func.count(Reservation.reservation_id)).scalar()
-        total_revenue = db.session.query(func.coalesce(func.sum(Payment.amount), 0)).scalar()
-        active_lots = db.session.query(func.count(ParkingLocation.location_id)).filter(ParkingLocation.is_active == True).scalar()
-        total_slots = db.session.query(func.count(ParkingSlot.slot_id)).scalar()
-        occupied_slots = db.session.query(func.count(Reservation.reservation_id))\
-                                   .filter(Reservation.status.in_(["booked", "occupied"])).scalar()
-        available_slots = total_slots - occupied_slots if total_slots else 0
-
-        metrics = {
-            "total_users": total_users,
-            "total_reservations": total_reservations,
-            "total_revenue": float(total_revenue),
-            "active_parking_lots": active_lots,
-            "total_slots": total_slots,
-            "occupied_slots": occupied_slots,
-            "available_slots": available_slots
-        }
-
-        cache_set("admindashboard:Girmada", metrics, 120)
+        # counters maintained on every commit, see backend/metrics.py
+        metrics = admin_metrics()
 
         return jsonify({
             "success": True,
@@ -1190,50 +1356,79 @@ def admindashboard():
         return jsonify({
             "success": False,
             "message": f"Error fetching dashboard metrics: {str(e)}"
-        }), 500    
-    
+        }), 500
+
 # get lot statistics
+# optional query params: city, page, per_page
 @app.route("/lotstats", methods=["GET"])  
+@replica_reads
 def lot_stats():
     try:
-        lots = db.session.query(ParkingLocation).all()
-        stats = []
+        city = request.args.get("city")
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", type=int)
+
+        # the lots on this page; every aggregate below is restricted to them
+        lot_ids = select(ParkingLocation.location_id).order_by(ParkingLocation.location_id)
+        if city:
+            lot_ids = lot_ids.where(ParkingLocation.city == city)
+        if per_page:
+            lot_ids = lot_ids.limit(per_page).offset((max(page, 1) - 1) * per_page)
+
+        slot_counts = select(
+            ParkingSlot.location_id,
+            func.count(ParkingSlot.slot_id).label("total_slots")
+        ).where(ParkingSlot.location_id.in_(lot_ids))\
+         .group_by(ParkingSlot.location_id).subquery()
+
+        reservation_counts = select(
+            Reservation.location_id,
+            func.count(Reservation.reservation_id).label("total_reservations"),
+            func.sum(case((Reservation.status.in_(["booked", "occupied"]), 1), else_=0)).label("occupied_slots")
+        ).where(Reservation.location_id.in_(lot_ids))\
+         .group_by(Reservation.location_id).subquery()
+
+        revenue = select(
+            Reservation.location_id,
+            func.sum(Payment.amount).label("total_revenue")
+        ).join(Payment, Payment.reservation_id == Reservation.reservation_id)\
+         .where(Reservation.location_id.in_(lot_ids))\
+         .group_by(Reservation.location_id).subquery()
+
+        # one grouped query for every lot on the page
+        lots = db.session.query(
+            ParkingLocation.location_id,
+            ParkingLocation.name,
+            ParkingLocation.city,
+            func.coalesce(slot_counts.c.total_slots, 0).label("total_slots"),
+            func.coalesce(reservation_counts.c.occupied_slots, 0).label("occupied_slots"),
+            func.coalesce(reservation_counts.c.total_reservations, 0).label("total_reservations"),
+            func.coalesce(revenue.c.total_revenue, 0).label("total_revenue")
+        ).outerjoin(slot_counts, slot_counts.c.location_id == ParkingLocation.location_id)\
+         .outerjoin(reservation_counts, reservation_counts.c.location_id == ParkingLocation.location_id)\
+         .outerjoin(revenue, revenue.c.location_id == ParkingLocation.location_id)\
+         .filter(ParkingLocation.location_id.in_(lot_ids))\
+         .order_by(ParkingLocation.location_id).all()
 
+        stats = []
         for lot in lots:
-            
-            total_slots = db.session.query(func.count(ParkingSlot.slot_id))\
-                                    .filter(ParkingSlot.location_id == lot.location_id).scalar()
-
-            
-            occupied_slots = db.session.query(func.count(Reservation.reservation_id))\
-                                       .filter(Reservation.location_id == lot.location_id,
-                                               Reservation.status.in_(["booked", "occupied"]))\
-                                       .scalar()
-
-            
-            revenue = db.session.query(func.coalesce(func.sum(Payment.amount), 0))\
-                                .join(Reservation, Payment.reservation_id == Reservation.reservation_id)\
-                                .filter(Reservation.location_id == lot.location_id).scalar()
-
-            
-            reservations = db.session.query(func.count(Reservation.reservation_id))\
-                                     .filter(Reservation.location_id == lot.location_id).scalar()
-
             stats.append({
                 "lot_id": lot.location_id,
                 "lot_name": lot.name,
                 "city": lot.city,
-                "total_slots": total_slots,
-                "occupied_slots": occupied_slots,
-                "available_slots": total_slots - occupied_slots,
-                "total_reservations": reservations,
-                "total_revenue": float(revenue)
+                "total_slots": lot.total_slots,
+                "occupied_slots": lot.occupied_slots,
+                "available_slots": lot.total_slots - lot.occupied_slots,
+                "total_reservations": lot.total_reservations,
+                "total_revenue": float(lot.total_revenue)
             })
 
         return jsonify({
             "success": True,
             "message": "Per-lot statistics fetched successfully",
-            "lot_stats": stats
+            "lot_stats": stats,
+            "page": page if per_page else 1,
+            "per_page": per_page
         }), 200
 
     except Exception as e:
@@ -1244,6 +1439,7 @@ def lot_stats():
 
 # get user statistics
 @app.route("/userstats", methods=["GET"])  
+@replica_reads
 def user_stats():
     try:
         now = datetime.now()
@@ -1256,19 +1452,22 @@ def user_stats():
             User.created_at >= thirty_days_ago
         ).scalar()
 
-        # Active users (made at least 1 reservation in last 30 days)
-        active_users = db.session.query(func.count(func.distinct(Reservation.user_id))).filter(
-            Reservation.start_time >= thirty_days_ago
+        # Active users (made at least 1 reservation in last 30 days), from the daily rollups
+        active_users = db.session.query(func.count(func.distinct(DailyUserStats.user_id))).filter(
+            DailyUserStats.day >= thirty_days_ago.date(),
+            DailyUserStats.reservations > 0
         ).scalar()
 
         # Top 5 users with most reservations
+        reservation_count = func.sum(DailyUserStats.reservations)
         top_users = db.session.query(
             User.username,
-            func.count(Reservation.reservation_id).label("reservation_count")
-        ).join(Reservation, Reservation.user_id == User.user_id)\
+            reservation_count.label("reservation_count")
+        ).join(DailyUserStats, DailyUserStats.user_id == User.user_id)\
          .filter(User.is_admin == False)\
-         .group_by(User.username)\
-         .order_by(func.count(Reservation.reservation_id).desc())\
+         .group_by(User.user_id, User.username)\
+         .having(reservation_count > 0)\
+         .order_by(reservation_count.desc())\
          .limit(5).all()
 
         top_users_list = [{"username": u, "reservations": c} for u, c in top_users]
@@ -1289,25 +1488,27 @@ def user_stats():
     
 # get financial statistics
 @app.route("/financialstats", methods=["GET"])  
+@replica_reads
 def financial_stats():
     try:
         now = datetime.now()
         thirty_days_ago = now - timedelta(days=30)
 
-        # Total revenue
-        total_revenue = db.session.query(func.coalesce(func.sum(Payment.amount), 0)).scalar()
+        # Totals and method breakdown come from the daily rollups
+        total_revenue = db.session.query(func.coalesce(func.sum(DailyPaymentMethodStats.revenue), 0)).scalar()
 
         # Revenue in last 30 days
-        revenue_this_month = db.session.query(func.coalesce(func.sum(Payment.amount), 0)).filter(
-            Payment.payment_date >= thirty_days_ago
+        revenue_this_month = db.session.query(func.coalesce(func.sum(DailyPaymentMethodStats.revenue), 0)).filter(
+            DailyPaymentMethodStats.day >= thirty_days_ago.date()
         ).scalar()
 
         # Payment method breakdown
         method_breakdown_query = db.session.query(
-            Payment.payment_method,
-            func.count(Payment.payment_id).label("count"),
-            func.sum(Payment.amount).label("total_amount")
-        ).group_by(Payment.payment_method).all()
+            DailyPaymentMethodStats.payment_method,
+            func.sum(DailyPaymentMethodStats.payments).label("count"),
+            func.sum(DailyPaymentMethodStats.revenue).label("total_amount")
+        ).group_by(DailyPaymentMethodStats.payment_method)\
+         .having(func.sum(DailyPaymentMethodStats.payments) > 0).all()
 
         payment_method_breakdown = [
             {
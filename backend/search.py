@@ -0,0 +1,108 @@
+"""Ranked full-text search over reviews and parking lots.
+
+On SQLite, FTS5 tables index Review.review_text and the lots' name, first
+address line and city. They are external-content tables over reviews and
+parking_locations, so they hold only the index, and triggers keep them in
+step with every insert, update and delete, however it is written. On
+Postgres the same searches run on GIN indexes over to_tsvector() of the
+same columns. install(), called from migrate(), creates whichever applies.
+
+Search terms are reduced to words, so user input can never be parsed as
+query syntax; the last word also matches as a prefix, for search-as-you-type.
+"""
+import re
+from sqlalchemy import text
+from backend import db
+
+
+# (fts table, content table, its key, indexed columns, fts5 options, postgres text config)
+INDEXES = {
+    "reviews": ("reviews_fts", "reviews", "review_id", ("review_text",),
+                "tokenize='porter unicode61'", "english"),
+    "locations": ("locations_fts", "parking_locations", "location_id", ("name", "address_line1", "city"),
+                  "tokenize='unicode61 remove_diacritics 2', prefix='2 3'", "simple"),
+}
+
+
+def _sqlite_ddl(fts, table, key, columns, options):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='{key}', {options})",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new}); END",
+    ]
+
+
+def _document(columns, config, alias=""):
+    """The Postgres tsvector expression the GIN index is built on."""
+    joined = " || ' ' || ".join(f"coalesce({alias}{c}, '')" for c in columns)
+    return f"to_tsvector('{config}', {joined})"
+
+
+def install():
+    """Create the search indexes, filling the FTS tables the first time."""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        for fts, table, key, columns, options, config in INDEXES.values():
+            if dialect == "sqlite":
+                exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                      {"name": fts}).first()
+                for statement in _sqlite_ddl(fts, table, key, columns, options):
+                    conn.execute(text(statement))
+                if not exists:
+                    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} "
+                                  f"USING gin ({_document(columns, config)})"))
+
+
+def terms(query):
+    """The words of a search, or [] when it has none."""
+    return re.findall(r"\w+", query or "")
+
+
+def _match(words, dialect):
+    if dialect == "sqlite":
+        return " ".join(f'"{w}"' for w in words) + "*"
+    return " & ".join(words) + ":*"
+
+
+def _search(name, select_list, joins, words, limit, offset):
+    fts, table, key, columns, options, config = INDEXES[name]
+    dialect = db.engine.dialect.name
+    params = {"q": _match(words, dialect), "limit": limit, "offset": offset}
+    if dialect == "sqlite":
+        sql = (f"SELECT {select_list} FROM {fts} JOIN {table} t ON t.{key} = {fts}.rowid {joins} "
+               f"WHERE {fts} MATCH :q ORDER BY bm25({fts}) LIMIT :limit OFFSET :offset")
+    else:
+        document = _document(columns, config, alias="t.")
+        sql = (f"SELECT {select_list} FROM {table} t {joins} "
+               f"WHERE {document} @@ to_tsquery('{config}', :q) "
+               f"ORDER BY ts_rank({document}, to_tsquery('{config}', :q)) DESC, t.{key} "
+               f"LIMIT :limit OFFSET :offset")
+    return db.session.execute(text(sql), params).mappings().all()
+
+
+def search_reviews(words, limit, offset=0):
+    """Reviews matching all the words, best match first."""
+    return _search("reviews",
+                   "t.review_id, u.username, l.name AS location, t.rating, t.review_text",
+                   "JOIN users u ON u.user_id = t.user_id "
+                   "JOIN parking_locations l ON l.location_id = t.location_id",
+                   words, limit, offset)
+
+
+def search_locations(words, limit, offset=0):
+    """Parking lots whose name, address or city match all the words, best match first."""
+    return _search("locations",
+                   "t.location_id, t.name, t.address_line1, t.city, t.state, t.postal_code, "
+                   "t.hourly_rate, t.is_active",
+                   "", words, limit, offset)
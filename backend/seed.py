@@ -36,8 +36,8 @@ def seed_data():
             "last_name": fake.last_name(),
             "phone": fake.phone_number()
         })
-    for u in users:
-            db.session.add(User(**u))
+    user_rows = [User(**u) for u in users]
+    db.session.add_all(user_rows)
     
     
     # add Admin
@@ -80,57 +80,52 @@ def seed_data():
             "hourly_rate": round(random.uniform(20, 50), 2)
         })
 
-    for loc in locations:
-        db.session.add(ParkingLocation(**loc))
+    location_rows = [ParkingLocation(**loc) for loc in locations]
+    db.session.add_all(location_rows)
     db.session.commit()
     print("\tSeeded parking locations !")
 
-    # Parking Slots
+    # Parking Slots (ids are left to the database, so sequences stay in step on Postgres)
+    vehicle_type_ids = [vt.vehicle_type_id for vt in VehicleType.query.all()]
     slots = []
-    slot_id = 1
-    for loc_id in range(1, NUM_LOCATIONS + 1):
+    for location in location_rows:
         for i in range(1, SLOTS_PER_LOCATION + 1):
-            slots.append({
-                "slot_id": slot_id,
-                "location_id": loc_id,
-                "slot_number": f"S{i}",
-                "vehicle_type_id": random.randint(1, NUM_VEHICLE_TYPES),
-                "is_covered": random.choice([True, False])
-            })
-            slot_id += 1
-    for s in slots:
-        db.session.add(ParkingSlot(**s))
+            slots.append(ParkingSlot(
+                location_id=location.location_id,
+                slot_number=f"S{i}",
+                vehicle_type_id=random.choice(vehicle_type_ids),
+                is_covered=random.choice([True, False])
+            ))
+    db.session.add_all(slots)
     db.session.commit()
     print("\tSeeded parking slots !")
 
     # Reservations
     reservations = []
     statuses = ['occupied', 'available']
-    for i in range(1, NUM_RESERVATIONS + 1):
-        user_id = i  # Use 1-to-1 for simplicity
-        slot = random.choice(slots)
+    # Use 1-to-1 for simplicity, on distinct slots so no two bookings overlap
+    for user, slot in zip(user_rows, random.sample(slots, NUM_RESERVATIONS)):
         start = datetime.now() + timedelta(hours=random.randint(1, 12))
         end = start + timedelta(hours=random.randint(1, 3))
         reservations.append({
-            "reservation_id": i,
-            "user_id": user_id,
-            "slot_id": slot["slot_id"],
-            "location_id": slot["location_id"],
+            "user_id": user.user_id,
+            "slot_id": slot.slot_id,
+            "location_id": slot.location_id,
             "vehicle_registration_number": fake.license_plate(),
             "start_time": start,
             "end_time": end,
             "status": statuses[random.randint(0,1)]
         })
-    for r in reservations:
-        db.session.add(Reservation(**r))
+    reservation_rows = [Reservation(**r) for r in reservations]
+    db.session.add_all(reservation_rows)
     db.session.commit()
     print("\tSeeded reservations !")
 
     # Payments
     payments = []
-    for i in range(1, PAYMENTS_FOR_RESERVATIONS + 1):
+    for reservation in reservation_rows[:PAYMENTS_FOR_RESERVATIONS]:
         payments.append({
-            "reservation_id": i,
+            "reservation_id": reservation.reservation_id,
             "amount": round(random.uniform(50, 200), 2),
             "payment_method": random.choice(["VISA", "UPI", "PayPal"]),
             "payment_status": "completed",
@@ -143,10 +138,10 @@ def seed_data():
 
     # Reviews
     reviews = []
-    for i in range(1, NUM_REVIEWS + 1):
+    for user in user_rows[:NUM_REVIEWS]:
         reviews.append({
-            "user_id": i,
-            "location_id": random.randint(1, NUM_LOCATIONS),
+            "user_id": user.user_id,
+            "location_id": random.choice(location_rows).location_id,
             "rating": random.randint(1, 5),
             "review_text": fake.sentence()
         })
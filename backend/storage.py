@@ -0,0 +1,260 @@
+"""Engine and connection settings for the app's database.
+
+DATABASE_URL selects the database: the SQLite file by default, or
+PostgreSQL (psycopg2), where reservations also get a range exclusion
+constraint, see backend/migrations.py.
+
+STORAGE_PROFILE picks how SQLite connections are tuned on connect:
+
+- "production" (default): WAL journal, so readers never wait for the
+  writer; synchronous=NORMAL, which stays consistent under WAL and only
+  risks the last commits on power loss; a memory-mapped file and a 64 MiB
+  page cache; and a busy timeout, so a writer queues behind another
+  instead of failing with "database is locked".
+- "legacy": SQLite's own defaults (rollback journal, no busy timeout).
+
+Engines keep a pool of DB_POOL_SIZE connections. With DB_SPLIT_READS=1
+plain SELECTs of a session that has not written yet are served by a
+second, read-only pool of DB_READ_POOL_SIZE connections (the "reader"
+bind), so reads never queue behind writers for a connection.
+
+Views marked with @replica_reads (the heavy analytics reports) read from a
+replica instead, so they never hold up bookings on the primary: either
+REPLICA_DATABASE_URL (e.g. a Postgres standby) or, with REPLICA_SNAPSHOT=1,
+a copy of the primary SQLite file that celery beat refreshes every
+REPLICA_REFRESH seconds. A replica more than REPLICA_MAX_LAG seconds behind,
+or whose lag can't be told, is ignored and the view reads from the primary.
+"""
+import os, sqlite3, time
+from functools import wraps
+from threading import Lock
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select, CompoundSelect
+from flask_sqlalchemy.session import Session
+
+
+PRAGMAS = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),      # ms
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": -int(os.getenv("SQLITE_CACHE_KIB", 64 * 1024)),     # negative: KiB
+        "temp_store": "MEMORY",
+    },
+    "legacy": {},
+}
+
+STORAGE_PROFILE = os.getenv("STORAGE_PROFILE", "production")
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 20))
+SPLIT_READS = os.getenv("DB_SPLIT_READS", "0") == "1"
+
+REPLICA_URL = os.getenv("REPLICA_DATABASE_URL")
+SNAPSHOT_REPLICA = os.getenv("REPLICA_SNAPSHOT", "0") == "1"
+REPLICA_MAX_LAG = int(os.getenv("REPLICA_MAX_LAG", 300))
+REPLICA_REFRESH = int(os.getenv("REPLICA_REFRESH", 60))
+# how often a process re-checks how far behind the replica is
+REPLICA_CHECK_INTERVAL = 5
+
+# the snapshot replica, relative to the instance folder like the primary
+SNAPSHOT_FILE = "replica.sqlite3"
+
+READER = "reader"
+REPLICA = "replica"
+
+
+def database_url(url):
+    """The configured URL, accepting the postgres:// scheme some hosts hand out."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def in_memory(url):
+    """Whether the URL is an in-memory SQLite database, which lives in a
+    single connection (StaticPool) rather than a pool."""
+    url = make_url(url)
+    return (url.get_backend_name() == "sqlite" and
+            (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"))
+
+
+def engine_options(url, pool_size=POOL_SIZE):
+    """Engine options (SQLALCHEMY_ENGINE_OPTIONS) for the configured profile.
+
+    The pool settings only apply to QueuePool engines (file-backed SQLite,
+    Postgres); an in-memory SQLite engine rejects them.
+    """
+    if STORAGE_PROFILE == "legacy" or in_memory(url):
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+    }
+
+
+def binds(uri):
+    """SQLALCHEMY_BINDS: the read-only bind when reads are split, and the
+    replica when there is one."""
+    binds = {}
+    if SPLIT_READS and not in_memory(uri):     # a second in-memory engine would be another database
+        binds[READER] = {"url": uri, **engine_options(uri, READ_POOL_SIZE)}
+    if REPLICA_URL:
+        binds[REPLICA] = {"url": database_url(REPLICA_URL),
+                          **engine_options(database_url(REPLICA_URL), READ_POOL_SIZE)}
+    elif SNAPSHOT_REPLICA:
+        url = f"sqlite:///{SNAPSHOT_FILE}"
+        binds[REPLICA] = {"url": url, **engine_options(url, READ_POOL_SIZE)}
+    return binds
+
+
+def pragmas(engine, **overrides):
+    """Apply the profile's pragmas to every new connection of a SQLite engine.
+    `overrides` adds pragmas, or skips one when given as None."""
+    if engine.dialect.name != "sqlite":
+        return
+    settings = {name: value for name, value in {**PRAGMAS[STORAGE_PROFILE], **overrides}.items()
+                if value is not None}
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def install(db):
+    """Hook the pragmas into the engines Flask-SQLAlchemy created."""
+    for key, engine in db.engines.items():
+        if key == READER:
+            pragmas(engine, query_only=1)
+        elif key == REPLICA:
+            pragmas(engine, query_only=1, journal_mode=None)   # keep the copy's own mode
+        else:
+            pragmas(engine)
+
+
+def read_engine(db):
+    """Engine for reads outside a session: the reader if there is one."""
+    return db.engines.get(READER, db.engine)
+
+
+def snapshot(db):
+    """Copy the primary SQLite database over the snapshot replica, atomically.
+
+    The copy is switched to a rollback journal, so processes still reading
+    the previous one keep it (by inode) and share no WAL files with it.
+    """
+    path = db.engines[REPLICA].url.database
+    partial = f"{path}.{os.getpid()}.partial"
+    source = db.engine.raw_connection()
+    try:
+        target = sqlite3.connect(partial)
+        try:
+            source.driver_connection.backup(target)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.replace(partial, path)
+
+
+# when the data on the replica was current (time.time()), per process
+_replica = {"checked": 0.0, "as_of": None, "snapshot": None}
+_replica_lock = Lock()
+
+
+def _replica_as_of(engine):
+    if SNAPSHOT_REPLICA and not REPLICA_URL:
+        try:
+            taken = os.path.getmtime(engine.url.database)
+        except OSError:
+            return None                         # no snapshot yet
+        if taken != _replica["snapshot"]:
+            _replica["snapshot"] = taken
+            engine.dispose()                    # pooled connections hold the old copy
+        return taken
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            lag = conn.execute(text(
+                "SELECT extract(epoch FROM now() - pg_last_xact_replay_timestamp())")).scalar()
+        if lag is None:
+            return None                         # nothing replayed yet, or not a standby: unknown
+        return time.time() - float(lag)
+    return time.time()
+
+
+def replica_engine(db):
+    """The replica engine, or None when there is none or it lags by more than
+    REPLICA_MAX_LAG seconds."""
+    engine = db.engines.get(REPLICA)
+    if engine is None:
+        return None
+
+    with _replica_lock:
+        now = time.time()
+        if now - _replica["checked"] >= REPLICA_CHECK_INTERVAL:
+            _replica["checked"] = now
+            try:
+                _replica["as_of"] = _replica_as_of(engine)
+            except Exception as err:
+                print("Replica check failed:", str(err))
+                _replica["as_of"] = None
+        as_of = _replica["as_of"]
+    return engine if as_of is not None and now - as_of <= REPLICA_MAX_LAG else None
+
+
+def replica_reads(view):
+    """Serve the view's reads from the replica while it is fresh enough."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions["sqlalchemy"]
+        engine = replica_engine(db)
+        if engine is None:
+            return view(*args, **kwargs)
+
+        db.session.info[REPLICA] = engine
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop(REPLICA, None)
+
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to the replica (inside @replica_reads views) or to
+    the reader bind until the session writes.
+
+    Once a flush or a DML statement has gone to the writer, every statement
+    follows it until the transaction ends, and a @replica_reads view stays
+    off the replica for the rest of the request, so a session always reads
+    its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get("wrote"):
+            if not self._flushing and isinstance(clause, (Select, CompoundSelect)):
+                replica = self.info.get(REPLICA)
+                if replica is not None:
+                    return replica
+                if READER in self._db.engines:
+                    return self._db.engines[READER]
+            elif self._flushing or clause is not None:
+                self.info["wrote"] = True
+                self.info.pop(REPLICA, None)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
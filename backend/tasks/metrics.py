@@ -0,0 +1,16 @@
+from backend import celery
+from backend.metrics import reconcile
+
+
+@celery.task(name="reconcile_admin_metrics")
+def reconcile_admin_metrics():
+    """
+    Recomputes the admin dashboard counters from the tables, undoing any
+    drift left by writes the commit hooks did not see.
+    """
+    drift = reconcile()
+    if drift is None:
+        print("Admin metrics not reconciled: deltas kept arriving, retried next run")
+    elif drift:
+        print("Admin metrics drift corrected:", drift)
+    return drift
@@ -1,20 +1,63 @@
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import select, exists, or_, and_
 from backend import celery, db
-from backend.models import User
-from backend.common import send_email_html
+from backend.models import User, Reservation
+from backend.common import send_emails_html
 import os
 
 
+# users read per query, and handed to one send_reminder_batch subtask
+REMINDER_CHUNK = 500
+
+
+def reminder_cohort(day):
+    """Users who neither booked on `day` nor have a booking starting that day,
+    as a single anti-join over reservations."""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    booked = exists().where(
+        Reservation.user_id == User.user_id,
+        or_(and_(Reservation.created_at >= start, Reservation.created_at < end),
+            and_(Reservation.start_time >= start, Reservation.start_time < end)))
+
+    return (select(User.user_id, User.email, User.first_name, User.username)
+            .where(~booked)
+            .order_by(User.user_id))
+
 
 @celery.task(name="send_daily_reminders")
 def send_daily_reminders():
-    users = User.query.all()
-    for user in users:
-        if not user.has_visited_today():
-            html_message = f"""
-            <h3>Hi {user.first_name or user.username},</h3>
-            <p>We noticed you haven't booked a parking spot today.</p>
-            <p>Reserve your spot now to avoid last-minute hassle!</p>
-            <br><p>– KwikPark Team</p>
-            """
-            send_email_html(user.email, "Parking Reminder", html_message)
-    return "Daily reminder emails sent."
\ No newline at end of file
+    """
+    Streams today's reminder cohort in keyset chunks and fans each chunk out
+    to a send_reminder_batch subtask.
+    """
+    cohort = reminder_cohort(date.today())
+    last_id = 0
+    batches = 0
+    while True:
+        chunk = db.session.execute(cohort.where(User.user_id > last_id).limit(REMINDER_CHUNK)).all()
+        if not chunk:
+            break
+        send_reminder_batch.delay([[u.email, u.first_name or u.username] for u in chunk])
+        last_id = chunk[-1].user_id
+        batches += 1
+    return f"Daily reminder emails queued in {batches} batches."
+
+
+@celery.task(name="send_reminder_batch")
+def send_reminder_batch(recipients):
+    messages = []
+    for email, name in recipients:
+        html_message = f"""
+        <h3>Hi {name},</h3>
+        <p>We noticed you haven't booked a parking spot today.</p>
+        <p>Reserve your spot now to avoid last-minute hassle!</p>
+        <br><p>– KwikPark Team</p>
+        """
+        messages.append((email, "Parking Reminder", html_message))
+
+    # a bad address must not stop the rest of the batch
+    failed = send_emails_html(messages)
+    for email, err in failed:
+        print(f"Reminder not sent to {email}: {err}")
+    return f"{len(recipients) - len(failed)} reminder emails sent."
@@ -0,0 +1,11 @@
+from backend import celery, db, storage
+
+
+@celery.task(name="refresh_replica")
+def refresh_replica():
+    """
+    Re-copies the primary SQLite database to the snapshot replica the
+    analytics routes read from.
+    """
+    storage.snapshot(db)
+    return db.engines[storage.REPLICA].url.database
@@ -1,35 +1,97 @@
-from backend import celery
-from backend.models import User, ParkingSlot
-from backend.common import send_email_html
-from datetime import datetime
+from datetime import datetime, date
+from sqlalchemy import select, func, case
+from backend import celery, db
+from backend.models import User, Reservation, Payment, ParkingLocation
+from backend.common import send_emails_html
+
+
+# report rows fetched per round trip, and handed to one email subtask
+REPORT_CHUNK = 500
+
+
+def month_bounds(month=None):
+    """[start, end) of the month 'YYYY-MM', by default the month that just ended."""
+    if month:
+        start = datetime.strptime(month, "%Y-%m")
+    else:
+        today = date.today()
+        start = datetime(today.year - (today.month == 1), (today.month - 2) % 12 + 1, 1)
+    end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    return start, end
+
+
+def monthly_activity(start, end):
+    """Per user: bookings, amount spent and most used lot in [start, end),
+    from one grouped query over reservations, payments and lots."""
+    bookings = func.count(Reservation.reservation_id)
+    per_lot = (select(
+                    Reservation.user_id,
+                    Reservation.location_id,
+                    bookings.label("bookings"),
+                    func.coalesce(func.sum(Payment.amount), 0).label("spent"),
+                    func.row_number().over(
+                        partition_by=Reservation.user_id,
+                        order_by=(bookings.desc(), Reservation.location_id)).label("rank"))
+               .outerjoin(Payment, Payment.reservation_id == Reservation.reservation_id)
+               .where(Reservation.start_time >= start, Reservation.start_time < end)
+               .group_by(Reservation.user_id, Reservation.location_id)
+               .subquery())
+
+    per_user = (select(
+                    per_lot.c.user_id,
+                    func.sum(per_lot.c.bookings).label("bookings"),
+                    func.sum(per_lot.c.spent).label("spent"),
+                    func.max(case((per_lot.c.rank == 1, per_lot.c.location_id))).label("top_location_id"))
+                .group_by(per_lot.c.user_id)
+                .subquery())
+
+    return (select(
+                User.user_id,
+                User.email,
+                User.first_name,
+                User.username,
+                func.coalesce(per_user.c.bookings, 0).label("bookings"),
+                func.coalesce(per_user.c.spent, 0).label("spent"),
+                ParkingLocation.name.label("top_lot"))
+            .outerjoin(per_user, per_user.c.user_id == User.user_id)
+            .outerjoin(ParkingLocation, ParkingLocation.location_id == per_user.c.top_location_id)
+            .order_by(User.user_id))
+
 
 @celery.task(name="generate_monthly_reports")
-def generate_monthly_reports():
+def generate_monthly_reports(month=None):
     """
     Generates a monthly HTML activity report for each user and sends via email.
+    The per-user figures are streamed from one query into batched email subtasks.
     """
-    users = User.query.all()
+    start, end = month_bounds(month)
+    month_label = start.strftime('%B %Y')
 
-    for user in users:
+    result = db.session.execute(monthly_activity(start, end).execution_options(yield_per=REPORT_CHUNK))
+    batches = 0
+    for rows in result.partitions():
+        send_monthly_report_batch.delay(month_label, [
+            [r.email, r.first_name or r.username, r.bookings, f"{r.spent:.2f}", r.top_lot or "N/A"]
+            for r in rows])
+        batches += 1
 
-        bookings = (ParkingSlot.query
-                    .filter_by(user_id=user.user_id)
-                    .all())
-        
-        monthly_bookings = [b for b in bookings if b.is_this_month()]
-        total_spent = sum(b.cost for b in monthly_bookings)
-        most_used = user.get_most_used_lot()
+    return f"Monthly reports queued in {batches} batches."
 
+
+@celery.task(name="send_monthly_report_batch")
+def send_monthly_report_batch(month_label, rows):
+    messages = []
+    for email, name, bookings, spent, most_used in rows:
         report_html = f"""
         <html>
         <body>
-            <h2>Monthly Parking Report - {datetime.now().strftime('%B %Y')}</h2>
-            <p>Hi {user.first_name or user.username},</p>
+            <h2>Monthly Parking Report - {month_label}</h2>
+            <p>Hi {name},</p>
             <p>Here's a summary of your parking activity this month:</p>
             <ul>
-                <li><strong>Total Bookings:</strong> {len(monthly_bookings)}</li>
+                <li><strong>Total Bookings:</strong> {bookings}</li>
                 <li><strong>Most Used Parking Lot:</strong> {most_used}</li>
-                <li><strong>Total Amount Spent:</strong> ₹{total_spent}</li>
+                <li><strong>Total Amount Spent:</strong> ₹{spent}</li>
             </ul>
             <p>Thank you for using KwikPark. Keep booking conveniently!</p>
             <br>
@@ -37,7 +99,9 @@ def generate_monthly_reports():
         </body>
         </html>
         """
+        messages.append((email, "Your Monthly Parking Activity Report", report_html))
 
-        send_email_html(user.email, "Your Monthly Parking Activity Report", report_html)
-
-    return "Monthly reports generated and sent successfully."
\ No newline at end of file
+    failed = send_emails_html(messages)
+    for email, err in failed:
+        print(f"Monthly report not sent to {email}: {err}")
+    return f"{len(rows) - len(failed)} monthly reports sent."
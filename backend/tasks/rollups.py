@@ -0,0 +1,14 @@
+from datetime import date, timedelta
+from backend import celery
+from backend.rollups import rebuild
+
+
+@celery.task(name="rebuild_rollups")
+def rebuild_rollups(days=None):
+    """
+    Re-derives the daily analytics rollups of the last `days` days (all of
+    history when None) from reservations and payments.
+    """
+    since = date.today() - timedelta(days=days) if days is not None else None
+    rebuild(since)
+    return str(since) if since else "all"
@@ -0,0 +1,28 @@
+import os
+from backend import celery, db, redis_client
+from backend.models import User
+from backend.user_report import get_report
+
+
+# a queued job no worker has started within REPORT_JOB_EXPIRES seconds is
+# dropped, and one running longer than REPORT_JOB_TIME_LIMIT is killed; the
+# key that dedupes identical requests outlives both, and the task clears it
+# as soon as it finishes
+REPORT_JOB_EXPIRES = 3600
+REPORT_JOB_TIME_LIMIT = 600
+
+
+def job_key(job_id):
+    return f"reportjob:{job_id}"
+
+
+@celery.task(name="build_user_report", bind=True, time_limit=REPORT_JOB_TIME_LIMIT)
+def build_user_report(self, user_id):
+    """
+    Builds (or finds) the user's PDF report in the report store and returns its file name.
+    """
+    try:
+        user = db.session.get(User, user_id)
+        return os.path.basename(get_report(user))
+    finally:
+        redis_client.delete(job_key(self.request.id))
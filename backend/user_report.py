@@ -0,0 +1,175 @@
+import os, glob, hashlib, tempfile
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet
+from sqlalchemy import func, select
+from backend import app, db
+from backend.models import ParkingLocation, ParkingSlot, Reservation, Review, Payment
+
+
+# generated PDFs, named <user_id>-<digest>.pdf
+REPORT_DIR = os.path.join(app.instance_path, "reports")
+
+
+def report_rows(user_id):
+    """Every reservation of the user with its lot, slot and payment, in one query."""
+    return (db.session.query(
+                Reservation.reservation_id,
+                Reservation.location_id,
+                Reservation.slot_id,
+                Reservation.start_time,
+                Reservation.end_time,
+                ParkingLocation.name.label("location_name"),
+                ParkingSlot.slot_number,
+                Payment.amount)
+            .join(ParkingLocation, ParkingLocation.location_id == Reservation.location_id)
+            .join(ParkingSlot, ParkingSlot.slot_id == Reservation.slot_id)
+            .outerjoin(Payment, Payment.reservation_id == Reservation.reservation_id)
+            .filter(Reservation.user_id == user_id)
+            .order_by(Reservation.start_time.desc())
+            .all())
+
+
+def report_digest(user):
+    """Content address of the user's report.
+
+    Changes whenever anything printed in it does: the user's details, their
+    latest reservation update, their payments or their reviews.
+    """
+    of_user = Reservation.user_id == user.user_id
+    state = db.session.execute(select(
+        select(func.count(Reservation.reservation_id)).where(of_user).scalar_subquery(),
+        select(func.max(Reservation.updated_at)).where(of_user).scalar_subquery(),
+        select(func.count(Payment.payment_id))
+            .join(Reservation, Reservation.reservation_id == Payment.reservation_id)
+            .where(of_user).scalar_subquery(),
+        select(func.max(Payment.payment_date))
+            .join(Reservation, Reservation.reservation_id == Payment.reservation_id)
+            .where(of_user).scalar_subquery(),
+        select(func.sum(Payment.amount))
+            .join(Reservation, Reservation.reservation_id == Payment.reservation_id)
+            .where(of_user).scalar_subquery(),
+        select(func.count(Review.review_id)).where(Review.user_id == user.user_id).scalar_subquery(),
+        select(func.max(Review.updated_at)).where(Review.user_id == user.user_id).scalar_subquery()
+    )).one()
+
+    key = "|".join(str(part) for part in (user.user_id, user.first_name, user.last_name, user.email, *state))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def report_path(user_id, digest):
+    return os.path.join(REPORT_DIR, f"{user_id}-{digest}.pdf")
+
+
+def build_report(user, rows, reviews):
+    """Render the report PDF and return its bytes."""
+    total_reservations = len(rows)
+    total_locations = len(set(r.location_id for r in rows))
+    total_slots = len(set(r.slot_id for r in rows))
+    total_amount = sum(r.amount for r in rows if r.amount is not None)
+    total_hours = sum(
+        ((r.end_time - r.start_time).total_seconds() / 3600)
+        for r in rows
+        if r.start_time and r.end_time
+    )
+    avg_duration = total_hours / total_reservations if total_reservations else 0
+
+    # PDF Setup
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Header
+    elements.append(Paragraph("KwikPark - Parking Report", styles["Title"]))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph("Contact: support@kwikpark.com", styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # User Info
+    elements.append(Paragraph(f"Name: {user.first_name} {user.last_name}", styles["Heading4"]))
+    elements.append(Paragraph(f"Email: {user.email}", styles["Normal"]))
+    elements.append(Spacer(1, 12))
+
+    # Reservations
+    elements.append(Paragraph("Reservation History", styles["Heading2"]))
+    month_map = {}
+    for r in rows:
+        month = r.start_time.strftime("%B %Y")
+        month_map.setdefault(month, []).append(r)
+
+    for month in sorted(month_map.keys(), reverse=True):
+        elements.append(Paragraph(month, styles["Heading3"]))
+        data = [["Location", "Slot", "In", "Out", "Amount"]]
+        for r in month_map[month]:
+            data.append([
+                r.location_name or "N/A",
+                r.slot_number or "N/A",
+                r.start_time.strftime("%d %b, %Y %H:%M") if r.start_time else "-",
+                r.end_time.strftime("%d %b, %Y %H:%M") if r.end_time else "-",
+                f"Rs. {r.amount:.2f}" if r.amount else "N/A"
+            ])
+        t = Table(data, hAlign='LEFT')
+        t.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+            ('GRID', (0, 0), (-1, -1), 1, colors.gray),
+        ]))
+        elements.append(t)
+        elements.append(Spacer(1, 12))
+
+    # Reviews
+    if reviews:
+        elements.append(Paragraph("Reviews", styles["Heading2"]))
+        for r in reviews:
+            elements.append(Paragraph(f"Rating: {r.rating}/5 - {r.review_text}", styles["Normal"]))
+            elements.append(Spacer(1, 6))
+
+    # Summary
+    elements.append(Spacer(1, 24))
+    elements.append(Paragraph("Summary", styles["Heading2"]))
+    summary_data = [
+        ["Total Reservations Made", total_reservations],
+        ["Total Locations Used", total_locations],
+        ["Total Slots Booked", total_slots],
+        ["Average Parking Duration (hrs)", f"{avg_duration:.2f}"],
+        ["Total Amount Paid", f"Rs. {total_amount:.2f}"]
+    ]
+    summary_table = Table(summary_data, hAlign='LEFT')
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    elements.append(summary_table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def get_report(user):
+    """Return the path of the user's current report PDF, building it only if
+    nothing it depends on has changed since the last build."""
+    digest = report_digest(user)
+    path = report_path(user.user_id, digest)
+    if os.path.exists(path):
+        return path
+
+    rows = report_rows(user.user_id)
+    reviews = Review.query.filter_by(user_id=user.user_id).all()
+    pdf = build_report(user, rows, reviews)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=REPORT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+    # older reports of this user can no longer be served
+    for old in glob.glob(os.path.join(REPORT_DIR, f"{user.user_id}-*.pdf")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
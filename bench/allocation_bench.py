@@ -0,0 +1,101 @@
+"""Benchmark of the slot lookup behind POST /reserve.
+
+Compares the per-slot loop reserve() used to run (one overlap query per slot
+of the lot) with backend/allocation.py's interval index, cold (reloaded from
+the DB) and warm. Each lot is booked solid except for its last slot, the
+worst case for the loop.
+
+    python bench/allocation_bench.py [slots ...] [--repeat N]
+
+Runs on a throwaway SQLite file unless DATABASE_URL is set; never point it
+at a database whose data you want to keep, its tables are created and
+filled here.
+"""
+import argparse, os, sys, tempfile, time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+from sqlalchemy import insert, select
+from backend import app, db
+from backend.allocation import find_free_slot, invalidate, overlap_clause
+from backend.migrations import migrate
+from backend.models import User, ParkingLocation, ParkingSlot, Reservation
+
+
+def make_lot(user_id, slots, start, end):
+    """A lot of `slots` slots, all but the last booked over [start, end)."""
+    location_id = db.session.execute(insert(ParkingLocation).values(
+        name=f"Bench Lot {slots}", address_line1="1 Main Road", city="Pune", country="India",
+        hourly_rate=40, total_slots=slots).returning(ParkingLocation.location_id)).scalar()
+    db.session.execute(insert(ParkingSlot), [
+        {"location_id": location_id, "slot_number": f"S{i}"} for i in range(1, slots + 1)])
+    slot_ids = db.session.scalars(select(ParkingSlot.slot_id)
+                                  .where(ParkingSlot.location_id == location_id)
+                                  .order_by(ParkingSlot.slot_id)).all()
+    db.session.execute(insert(Reservation), [
+        {"user_id": user_id, "location_id": location_id, "slot_id": slot_id,
+         "vehicle_registration_number": "MH12AB1234", "start_time": start, "end_time": end}
+        for slot_id in slot_ids[:-1]])
+    db.session.commit()
+    return location_id, slot_ids[-1]
+
+
+def per_slot_loop(location_id, start, end):
+    """The lookup reserve() made before the index: one query per slot."""
+    for slot in ParkingSlot.query.filter_by(location_id=location_id).all():
+        if not Reservation.query.filter(overlap_clause(slot.slot_id, start, end)).first():
+            return slot.slot_id
+    return None
+
+
+def cold_index(location_id, start, end):
+    invalidate(location_id)
+    return find_free_slot(location_id, start, end)
+
+
+def warm_index(location_id, start, end):
+    return find_free_slot(location_id, start, end)
+
+
+def timed(lookup, location_id, start, end, repeat):
+    """Milliseconds per lookup, the best of `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        lookup(location_id, start, end)
+        best = min(best, time.perf_counter() - began)
+        db.session.rollback()
+    return best * 1000
+
+
+def main(sizes, repeat):
+    db.create_all()
+    migrate()
+    user_id = db.session.execute(insert(User).values(
+        username="bench", email="bench@example.com", password_hash="x").returning(User.user_id)).scalar()
+
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    end = start + timedelta(hours=2)
+
+    lookups = [("old loop", per_slot_loop), ("cold index", cold_index), ("warm index", warm_index)]
+    print(f"{'slots':>7}" + "".join(f"{name:>14}" for name, _ in lookups))
+    for slots in sizes:
+        location_id, free_slot_id = make_lot(user_id, slots, start, end)
+        for _, lookup in lookups:
+            assert lookup(location_id, start, end) == free_slot_id
+        print(f"{slots:>7}" + "".join(f"{timed(lookup, location_id, start, end, repeat):>11.2f} ms"
+                                      for _, lookup in lookups))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("slots", nargs="*", type=int, default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    with app.app_context():
+        main(args.slots, args.repeat)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
@@ -0,0 +1,88 @@
+"""Benchmark of a hot cache hit, the path behind /admindashboard and
+/userdashboard.
+
+Compares the Redis-only lookup cached() made before the in-process tier
+(MGET of the tag versions, GET of the entry, json.loads) with cached() as
+it is now, which answers from the process's own versions and LRU. It then
+bumps the tag the way another process would (INCR and publish, from a
+separate connection) and checks that the next lookup reloads the value.
+
+    python bench/cache_bench.py [--hits N] [--payload-kb KB]
+
+Like the app, it needs Redis on REDIS_HOST/REDIS_PORT. It only writes keys
+under the "bench" namespace and tag.
+"""
+import argparse, json, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+import redis
+from backend import redis_client, cache
+
+TAGS = ["bench"]
+
+
+def payload(kb):
+    """A dashboard-like list of dicts of about `kb` KB as JSON."""
+    row = {"location_id": 1, "name": "Bench Lot", "city": "Pune", "hourly_rate": 40.0,
+           "total_slots": 100, "occupied_slots": ["S1", "S2", "S3"], "is_active": True}
+    return [dict(row, location_id=i) for i in range(kb * 1024 // len(json.dumps(row)) + 1)]
+
+
+def redis_path():
+    """The lookup before the in-process tier: two round trips and a decode."""
+    versions = [int(v or 0) for v in redis_client.mget([f"cachetag:{tag}" for tag in TAGS])]
+    return json.loads(redis_client.get(cache.versioned_key("bench", "payload", versions)))
+
+
+def timed(lookup, hits):
+    """Microseconds per hit."""
+    began = time.perf_counter()
+    for _ in range(hits):
+        lookup()
+    return (time.perf_counter() - began) / hits * 1e6
+
+
+def main(hits, kb):
+    data = payload(kb)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return data
+
+    def tiered():
+        return cache.cached("bench", "payload", loader, ttl=300, tags=TAGS)
+
+    tiered()
+    if not cache._subscribed.wait(5):
+        sys.exit("the invalidation subscriber did not come up; is Redis reachable?")
+    tiered()                                    # now with this process's own tag versions
+    assert redis_path() == tiered() == data
+
+    print(f"{len(json.dumps(data)) / 1024:.1f} KB payload, {hits} hits")
+    print(f"  Redis only (MGET + GET + json.loads): {timed(redis_path, hits):>8.1f} us/hit")
+    print(f"  in-process tier:                      {timed(tiered, hits):>8.1f} us/hit")
+
+    # another process invalidates the tag
+    other = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=int(os.getenv("REDIS_PORT", 6379)))
+    version = other.incr(f"cachetag:{TAGS[0]}")
+    other.publish(cache.INVALIDATION_CHANNEL, json.dumps({TAGS[0]: version}))
+    before = len(loads)
+    deadline = time.monotonic() + 5
+    while len(loads) == before and time.monotonic() < deadline:
+        tiered()
+        time.sleep(0.001)
+    print(f"  remote bump picked up: {'yes' if len(loads) > before else 'NO'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hits", type=int, default=2000)
+    parser.add_argument("--payload-kb", type=int, default=6)
+    args = parser.parse_args()
+    main(args.hits, args.payload_kb)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
@@ -0,0 +1,77 @@
+"""Benchmark of POST /createlot for large lots.
+
+Compares the per-object path clot() used to take (one ParkingSlot ORM
+object per slot, flushed through the unit of work) with the endpoint as it
+is now, which expands the layout and inserts the slots with one
+executemany INSERT.
+
+    python bench/createlot_bench.py [slots ...] [--repeat N]
+
+Runs on a throwaway SQLite file unless DATABASE_URL is set; never point it
+at a database whose data you want to keep, its tables are created and
+filled here.
+"""
+import argparse, os, sys, tempfile, time
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+from backend import app, db
+from backend.migrations import migrate
+from backend.models import ParkingLocation, ParkingSlot
+
+lot_names = (f"Bench Lot {i}" for i in count(1))
+
+
+def lot_fields(slots):
+    return {"name": next(lot_names), "address_line1": "1 Main Road", "city": "Pune",
+            "country": "India", "hourly_rate": 40, "is_active": True, "total_slots": slots}
+
+
+def per_object(slots):
+    """What clot() did before the bulk insert: one ORM object per slot."""
+    lot = ParkingLocation(**lot_fields(slots))
+    db.session.add(lot)
+    db.session.flush()
+    for i in range(1, slots + 1):
+        db.session.add(ParkingSlot(location_id=lot.location_id, slot_number=f"S{i}"))
+    db.session.commit()
+
+
+def endpoint(slots):
+    response = app.test_client().post("/createlot", json=lot_fields(slots))
+    assert response.status_code == 200, response.get_json()
+
+
+def timed(create, slots, repeat):
+    """Seconds per lot, the best of `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        create(slots)
+        best = min(best, time.perf_counter() - began)
+    return best
+
+
+def main(sizes, repeat):
+    db.create_all()
+    migrate()
+
+    creates = [("per object", per_object), ("/createlot", endpoint)]
+    print(f"{'slots':>7}" + "".join(f"{name:>14}" for name, _ in creates))
+    for slots in sizes:
+        print(f"{slots:>7}" + "".join(f"{timed(create, slots, repeat):>12.3f} s"
+                                      for _, create in creates))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("slots", nargs="*", type=int, default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    with app.app_context():
+        main(args.slots, args.repeat)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
@@ -0,0 +1,139 @@
+"""Benchmark of idle /events streams on the ASGI app.
+
+Starts `uvicorn backend.asgi:application` on a throwaway SQLite file, opens
+N logged-in /events streams that then sit idle (the common case: a tab
+left open on a lot map), and reports the server's resident memory per
+stream and the GET /getlot latency other users see meanwhile.
+
+    python bench/events_idle_bench.py [streams ...] [--requests N]
+
+The memory is read from /proc, so it runs on Linux. Like the app, it needs
+Redis on REDIS_HOST/REDIS_PORT.
+"""
+import argparse, http.client, os, resource, socket, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+from sqlalchemy import insert
+from backend import app, db
+from backend.auth import issue_token
+from backend.migrations import migrate
+from backend.models import User, ParkingLocation, ParkingSlot
+
+HOST = "127.0.0.1"
+
+
+def seed():
+    """A user to log in as and one 50-slot lot; returns the user's token."""
+    db.create_all()
+    migrate()
+    user_id = db.session.execute(insert(User).values(
+        username="bench", email="bench@example.com", password_hash="x").returning(User.user_id)).scalar()
+    location_id = db.session.execute(insert(ParkingLocation).values(
+        name="Bench Lot", address_line1="1 Main Road", city="Pune", country="India",
+        hourly_rate=40, total_slots=50, is_active=True).returning(ParkingLocation.location_id)).scalar()
+    db.session.execute(insert(ParkingSlot), [
+        {"location_id": location_id, "slot_number": f"S{i}"} for i in range(1, 51)])
+    db.session.commit()
+    return issue_token(user_id)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def rss_kib(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+def get(port, path, token):
+    conn = http.client.HTTPConnection(HOST, port, timeout=10)
+    try:
+        conn.request("GET", path, headers={"Cookie": f"token={token}"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def latency_ms(port, token, requests):
+    """(median, p95) milliseconds of GET /getlot."""
+    times = []
+    for _ in range(requests):
+        began = time.perf_counter()
+        assert get(port, "/getlot", token) == 200
+        times.append((time.perf_counter() - began) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def open_stream(port, token):
+    """An /events stream, read up to its first frame and then left idle."""
+    sock = socket.create_connection((HOST, port), timeout=10)
+    sock.sendall(f"GET /events HTTP/1.1\r\nHost: {HOST}\r\nCookie: token={token}\r\n"
+                 "Accept: text/event-stream\r\n\r\n".encode())
+    head = b""
+    while b"retry:" not in head:
+        chunk = sock.recv(4096)
+        assert chunk, "stream closed"
+        head += chunk
+    assert head.startswith(b"HTTP/1.1 200"), head.split(b"\r\n")[0]
+    return sock
+
+
+def main(levels, requests):
+    with app.app_context():
+        token = seed()
+
+    # one file descriptor per stream on both ends
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.asgi:application",
+                               "--host", HOST, "--port", str(port), "--log-level", "warning"],
+                              cwd=ROOT, env=os.environ.copy())
+    streams = []
+    try:
+        for _ in range(100):
+            try:
+                get(port, "/getlot", token)
+                break
+            except OSError:
+                time.sleep(0.1)
+        latency_ms(port, token, requests)               # warm the caches and the pool
+
+        baseline = rss_kib(server.pid)
+        print(f"{'streams':>8}{'RSS':>12}{'per stream':>14}{'getlot p50':>13}{'getlot p95':>13}")
+        for level in [0] + sorted(levels):
+            while len(streams) < level:
+                streams.append(open_stream(port, token))
+            time.sleep(0.5)                             # let the allocations settle
+            rss = rss_kib(server.pid)
+            per_stream = f"{(rss - baseline) / level:>10.1f} KiB" if level else f"{'':>14}"
+            median, p95 = latency_ms(port, token, requests)
+            print(f"{level:>8}{rss / 1024:>8.1f} MiB{per_stream}{median:>10.2f} ms{p95:>10.2f} ms")
+    finally:
+        for sock in streams:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("streams", nargs="*", type=int, default=[100, 1000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    main(args.streams, args.requests)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
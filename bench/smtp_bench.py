@@ -0,0 +1,104 @@
+"""Throughput benchmark of backend/mailer.py's SMTP pool.
+
+Sends a batch of HTML messages to a local aiosmtpd server three ways: a new
+connection per message, as send_email_html() used to do; one message at a
+time over the pool; and the batch through SMTPPool.send_many(). A remote
+server's connection setup (TCP, STARTTLS, login) is stood in for by
+--handshake-ms, a delay the local server adds to every EHLO.
+
+    python bench/smtp_bench.py [--messages N] [--handshake-ms MS] [--pool-size N]
+
+Needs aiosmtpd (pip install aiosmtpd); nothing leaves the machine.
+"""
+import argparse, asyncio, os, socket, sys, tempfile, time
+from smtplib import SMTP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.pop("GMAIL_PASSWORD", None)         # the local server takes no login
+
+from aiosmtpd.controller import Controller
+from backend.common import html_email
+from backend.mailer import SMTPPool
+
+HOST = "127.0.0.1"
+SENDER = "bench@example.com"
+
+
+class Sink:
+    """Accepts every message; each EHLO costs `handshake` seconds."""
+
+    def __init__(self, handshake):
+        self.handshake = handshake
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def connection_per_message(port, messages, pool_size):
+    for to_email, message in messages:
+        with SMTP(HOST, port, timeout=30) as server:
+            server.sendmail(SENDER, to_email, message)
+
+
+def pool_one_at_a_time(port, messages, pool_size):
+    pool = SMTPPool(host=HOST, port=port, starttls=False, sender=SENDER, size=pool_size)
+    for to_email, message in messages:
+        pool.send(to_email, message)
+    pool.close()
+
+
+def pool_send_many(port, messages, pool_size):
+    pool = SMTPPool(host=HOST, port=port, starttls=False, sender=SENDER, size=pool_size)
+    assert not pool.send_many(messages)
+    pool.close()
+
+
+def main(count, handshake_ms, pool_size):
+    sink = Sink(handshake_ms / 1000)
+    port = free_port()
+    controller = Controller(sink, hostname=HOST, port=port)
+    controller.start()
+
+    body = "<h1>Booking reminder</h1>" + "<p>Your parking slot is booked for tomorrow.</p>" * 20
+    messages = [(f"user{i}@example.com", html_email(f"user{i}@example.com", "Reminder", body))
+                for i in range(count)]
+
+    print(f"{count} messages, {handshake_ms} ms handshake, pool of {pool_size}")
+    try:
+        for name, send in [("connection per message", connection_per_message),
+                           ("pool, one at a time", pool_one_at_a_time),
+                           ("pool, send_many", pool_send_many)]:
+            before = sink.received
+            began = time.perf_counter()
+            send(port, messages, pool_size)
+            elapsed = time.perf_counter() - began
+            assert sink.received - before == count
+            print(f"  {name:<24}{count / elapsed:>8.0f} msg/s")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--handshake-ms", type=float, default=0)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+    main(args.messages, args.handshake_ms, args.pool_size)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
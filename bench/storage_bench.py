@@ -0,0 +1,166 @@
+"""Concurrency benchmark of the SQLite storage profiles (backend/storage.py).
+
+For each profile -- "legacy" (SQLite defaults), "production" (WAL and the
+tuned pragmas) and production with DB_SPLIT_READS=1 -- a copy of one seeded
+database is hammered for a few seconds by writer threads committing
+single-row INSERTs and reader threads running a per-user reservation
+aggregate. Reports throughput, p99 latency and "database is locked" errors.
+
+    python bench/storage_bench.py [--mix WRITERSxREADERS ...] [--seconds S]
+
+Each profile runs in a child process, since the profile is read from the
+environment at import. Everything happens in a throwaway directory.
+"""
+import argparse, json, os, random, shutil, sqlite3, subprocess, sys, tempfile, threading, time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+PROFILES = [
+    ("legacy", {"STORAGE_PROFILE": "legacy", "DB_SPLIT_READS": "0"}),
+    ("production", {"STORAGE_PROFILE": "production", "DB_SPLIT_READS": "0"}),
+    ("production + split reads", {"STORAGE_PROFILE": "production", "DB_SPLIT_READS": "1"}),
+]
+
+USERS = 200
+RESERVATIONS = 20000
+
+
+def seed():
+    """Users, one lot and RESERVATIONS reservations spread over the users."""
+    from sqlalchemy import insert, select
+    from backend import db
+    from backend.migrations import migrate
+    from backend.models import User, ParkingLocation, ParkingSlot, Reservation
+
+    db.create_all()
+    migrate()
+    db.session.execute(insert(User), [{"username": f"bench{i}", "email": f"bench{i}@example.com",
+                                       "password_hash": "x"} for i in range(USERS)])
+    location_id = db.session.execute(insert(ParkingLocation).values(
+        name="Bench Lot", address_line1="1 Main Road", city="Pune", country="India",
+        hourly_rate=40, total_slots=100).returning(ParkingLocation.location_id)).scalar()
+    db.session.execute(insert(ParkingSlot), [
+        {"location_id": location_id, "slot_number": f"S{i}"} for i in range(1, 101)])
+    user_ids = db.session.scalars(select(User.user_id)).all()
+    slot_ids = db.session.scalars(select(ParkingSlot.slot_id)).all()
+    start = datetime(2025, 1, 1, 8)
+    db.session.execute(insert(Reservation), [
+        {"user_id": user_ids[i % USERS], "location_id": location_id, "slot_id": slot_ids[i % 100],
+         "vehicle_registration_number": "MH12AB1234",
+         "start_time": start + timedelta(hours=i), "end_time": start + timedelta(hours=i + 1)}
+        for i in range(RESERVATIONS)])
+    db.session.commit()
+
+
+def worker(app, operation, stop, results):
+    from sqlalchemy.exc import OperationalError
+    from backend import db
+
+    latencies, locked = [], 0
+    with app.app_context():
+        while not stop.is_set():
+            began = time.perf_counter()
+            try:
+                operation(db.session)
+                db.session.commit()
+                latencies.append(time.perf_counter() - began)
+            except OperationalError as err:
+                db.session.rollback()
+                if "locked" not in str(err):
+                    raise
+                locked += 1
+        db.session.remove()
+    results.append((latencies, locked))
+
+
+def child(writers, readers, seconds):
+    """Run one mix under the profile set in the environment; prints JSON."""
+    from sqlalchemy import func, insert, select
+    from backend import app
+    from backend.models import OTP, Reservation
+
+    with app.app_context():
+        from backend import db
+        user_ids = db.session.scalars(select(Reservation.user_id).distinct()).all()
+        db.session.remove()
+
+    def write(session):
+        session.execute(insert(OTP).values(user_id=random.choice(user_ids), otp_code="1234"))
+
+    def read(session):
+        session.execute(select(func.count(), func.min(Reservation.start_time), func.max(Reservation.end_time))
+                        .where(Reservation.user_id == random.choice(user_ids))).one()
+
+    stop = threading.Event()
+    write_results, read_results = [], []
+    threads = ([threading.Thread(target=worker, args=(app, write, stop, write_results)) for _ in range(writers)] +
+               [threading.Thread(target=worker, args=(app, read, stop, read_results)) for _ in range(readers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if len(write_results) + len(read_results) < len(threads):
+        sys.exit("a worker thread failed, see above")
+
+    def summary(results):
+        latencies = sorted(latency for thread_latencies, _ in results for latency in thread_latencies)
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan")
+        return {"per_second": len(latencies) / seconds, "p99_ms": p99,
+                "locked": sum(locked for _, locked in results)}
+
+    print(json.dumps({"writes": summary(write_results), "reads": summary(read_results)}))
+
+
+def main(mixes, seconds):
+    from backend import app
+    with app.app_context():
+        seed()
+    from backend import db
+    seeded = db.engine.url.database
+    db.engine.dispose()
+    # back to a rollback journal, which WAL mode would otherwise persist into the legacy run
+    with sqlite3.connect(seeded) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    workdir = tempfile.mkdtemp()
+    print(f"{seconds} s per run, {os.cpu_count()} CPUs")
+    for writers, readers in mixes:
+        label = f"{writers} writers / {readers} readers"
+        print(f"\n  {label:<30}{'writes/s':>9}{'reads/s':>10}{'write p99':>12}{'read p99':>11}{'locked':>8}")
+        for name, env in PROFILES:
+            copy = os.path.join(workdir, f"{name.replace(' ', '_')}.sqlite3")
+            shutil.copy(seeded, copy)
+            run = subprocess.run([sys.executable, __file__, "--child", f"{writers}x{readers}",
+                                  "--seconds", str(seconds)],
+                                 env={**os.environ, **env, "DATABASE_URL": f"sqlite:///{copy}"},
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(run.stdout.strip().splitlines()[-1])
+            w, r = result["writes"], result["reads"]
+            print(f"  {name:<30}{w['per_second']:>9.0f}{r['per_second']:>10.0f}"
+                  f"{w['p99_ms']:>9.0f} ms{r['p99_ms']:>8.0f} ms{w['locked'] + r['locked']:>8}")
+    shutil.rmtree(workdir)
+
+
+def mix(value):
+    writers, readers = value.lower().split("x")
+    return int(writers), int(readers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", nargs="*", type=mix, default=[(4, 16), (8, 32)])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--child", type=mix, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child, args.seconds)
+    else:
+        main(args.mix, args.seconds)
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
@@ -1,10 +1,14 @@
 from backend import app , db
 from backend.seed import seed_data
+from backend.migrations import migrate
+from backend.rollups import backfill as backfill_rollups
 
 
 with app.app_context():
     db.create_all()
+    migrate()
     seed_data()    
+    backfill_rollups()
 
 if __name__=='__main__':
     app.run(debug=True)
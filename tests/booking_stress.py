@@ -0,0 +1,82 @@
+"""Concurrent booking run used by test_allocation.py, in its own process so
+that it can use a pooled, file-backed database even when the suite runs on
+in-memory SQLite.
+
+    DATABASE_URL=... python tests/booking_stress.py <threads> <slots>
+
+Every thread books the same window on one lot at once; prints a JSON
+summary of the outcomes and of any overlapping bookings left in the DB.
+"""
+import json, os, sys, threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from backend import app, db
+from backend.allocation import reserve_slot, load_index, SlotContention
+from backend.migrations import migrate
+from backend.models import User, ParkingLocation, ParkingSlot, Reservation
+
+
+def main(threads, slots):
+    db.create_all()
+    migrate()
+
+    user = User(username="stress", email="stress@example.com", password_hash="x")
+    lot = ParkingLocation(name="Stress Lot", address_line1="1 Main Road", city="Pune",
+                          country="India", hourly_rate=40, total_slots=slots)
+    db.session.add_all([user, lot])
+    db.session.flush()
+    db.session.add_all([ParkingSlot(location_id=lot.location_id, slot_number=f"S{i}")
+                        for i in range(1, slots + 1)])
+    db.session.commit()
+    user_id, location_id = user.user_id, lot.location_id
+
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    end = start + timedelta(hours=2)
+    load_index(location_id)                     # every booker starts from the same warm index
+
+    outcomes = {"booked": 0, "full": 0, "contention": 0, "error": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def book():
+        with app.app_context():
+            barrier.wait()
+            try:
+                outcome = "booked" if reserve_slot(user_id, location_id, "MH12AB1234", start, end) else "full"
+            except SlotContention:
+                outcome = "contention"
+            except Exception as err:
+                print("Booking failed:", str(err), file=sys.stderr)
+                outcome = "error"
+            finally:
+                db.session.remove()
+        with lock:
+            outcomes[outcome] += 1
+
+    workers = [threading.Thread(target=book) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    other = aliased(Reservation)
+    outcomes["overlaps"] = db.session.scalar(
+        select(func.count()).select_from(Reservation)
+        .join(other, (other.slot_id == Reservation.slot_id) &
+                     (other.reservation_id < Reservation.reservation_id) &
+                     (other.start_time < Reservation.end_time) &
+                     (other.end_time > Reservation.start_time))
+        .where(Reservation.location_id == location_id))
+    outcomes["reservations"] = db.session.scalar(
+        select(func.count()).select_from(Reservation).where(Reservation.location_id == location_id))
+    print(json.dumps(outcomes))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), int(sys.argv[2]))
+    sys.stdout.flush()
+    os._exit(0)                 # don't wait on the redis subscriber threads
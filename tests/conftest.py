@@ -0,0 +1,87 @@
+"""Fixtures shared by the test suite.
+
+The suite runs against DATABASE_URL: an in-memory SQLite database unless it
+is set, e.g. to a throwaway Postgres database, to run the same tests there.
+Redis is not needed; commit hooks that cannot reach it only log. Tests that
+need it take the fake_redis fixture (fakeredis).
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+import threading
+from datetime import datetime, timedelta
+import pytest
+import backend
+from backend import app as flask_app, db, allocation, cache, metrics, occupancy, push, routes
+from backend.migrations import migrate
+from backend.tasks import user_report
+from backend.models import User, ParkingLocation, ParkingSlot
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    with flask_app.app_context():
+        db.create_all()
+        migrate()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    yield
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    db.session.remove()
+    allocation.invalidate()
+
+
+def dialect():
+    return db.engine.dialect.name
+
+
+@pytest.fixture
+def user():
+    user = User(username="tester", email="tester@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_lot():
+    def make_lot(slots, name="Test Lot"):
+        lot = ParkingLocation(name=name, address_line1="1 Main Road", city="Pune",
+                              country="India", hourly_rate=40, total_slots=slots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.add_all([ParkingSlot(location_id=lot.location_id, slot_number=f"S{i}")
+                            for i in range(1, slots + 1)])
+        db.session.commit()
+        return lot
+    return make_lot
+
+
+@pytest.fixture
+def window():
+    """A one-hour booking window tomorrow."""
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    return start, start + timedelta(hours=1)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point every Redis client of the app at one in-process fake server,
+    with the cache's in-process tier starting empty."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    for module in (backend, cache, metrics, occupancy, push, routes, user_report):
+        monkeypatch.setattr(module, "redis_client", client)
+    monkeypatch.setattr(cache, "_local", cache.LocalCache())
+    monkeypatch.setattr(cache, "_versions", {})
+    monkeypatch.setattr(cache, "_subscribed", threading.Event())
+    return server
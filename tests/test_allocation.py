@@ -0,0 +1,34 @@
+import json, os, subprocess, sys
+import pytest
+from sqlalchemy import select
+from backend import db
+from backend.allocation import reserve_slot, load_index
+from backend.models import ParkingSlot
+from backend.storage import in_memory
+
+STRESS_SCRIPT = os.path.join(os.path.dirname(__file__), "booking_stress.py")
+
+
+def test_books_every_slot_then_reports_full(user, make_lot, window):
+    lot = make_lot(3)
+    load_index(lot.location_id)
+    booked = {reserve_slot(user.user_id, lot.location_id, "MH12AB1234", *window)[1] for _ in range(3)}
+
+    assert booked == set(db.session.scalars(
+        select(ParkingSlot.slot_id).where(ParkingSlot.location_id == lot.location_id)))
+    assert reserve_slot(user.user_id, lot.location_id, "MH12AB1234", *window) is None
+
+
+@pytest.mark.parametrize("threads, slots", [(64, 200), (32, 32)])
+def test_concurrent_bookings_never_overlap_or_report_false_full(tmp_path, threads, slots):
+    url = db.engine.url.render_as_string(hide_password=False)
+    if in_memory(url):
+        url = f"sqlite:///{tmp_path / 'stress.sqlite3'}"
+    run = subprocess.run([sys.executable, STRESS_SCRIPT, str(threads), str(slots)],
+                         env={**os.environ, "DATABASE_URL": url},
+                         capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr
+    outcomes = json.loads(run.stdout.strip().splitlines()[-1])
+
+    assert outcomes["overlaps"] == 0
+    assert outcomes["booked"] == threads == outcomes["reservations"], outcomes
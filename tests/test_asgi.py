@@ -0,0 +1,47 @@
+import pytest
+from backend import app, db, events
+from backend.models import User
+
+pytest.importorskip("aiosqlite")
+fakeredis = pytest.importorskip("fakeredis")
+
+from starlette.testclient import TestClient
+from backend import asgi
+
+
+@pytest.fixture
+def redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(asgi, "redis", fakeredis.FakeAsyncRedis(server=fake_redis, decode_responses=True))
+
+
+def test_deferred_session_leaves_hooks_to_the_caller(monkeypatch):
+    applied = []
+    monkeypatch.setattr(events, "_handlers", [(lambda session, obj, op: [op], applied.extend)])
+
+    db.session.info[events.DEFER] = True
+    db.session.add(User(username="deferred", email="deferred@example.com", password_hash="x"))
+    db.session.commit()
+    assert applied == []
+
+    events.apply_committed(events.take_committed(db.session))
+    assert applied == ["insert"]
+    assert events.take_committed(db.session) == []
+
+
+def test_getlot_matches_flask(redis, make_lot):
+    make_lot(3, "First")
+    make_lot(2, "Second")
+    flask = app.test_client().get("/getlot").get_json()
+    assert TestClient(asgi.application).get("/getlot").json() == flask
+    assert set(flask["data"]) == {"First", "Second"}
+
+
+def test_reserve_unknown_lot_is_not_found(user):
+    from backend.auth import issue_token
+    client = app.test_client()
+    with app.app_context():
+        client.set_cookie("token", issue_token(user.user_id))
+    response = client.post("/reserve", json={"name": "Nowhere", "start_time": "2030-01-01T10:00",
+                                             "end_time": "2030-01-01T11:00",
+                                             "vehicle_registration_number": "MH12AB1234"})
+    assert response.status_code == 404
@@ -0,0 +1,76 @@
+from sqlalchemy import select
+from backend import db
+from backend.cache import _tags_for
+from backend.models import User, ParkingSlot, Reservation
+
+
+def test_moved_reservation_stales_old_and_new_owner(user, make_lot, window):
+    first, second = make_lot(1, "First"), make_lot(1, "Second")
+    other = User(username="other", email="other@example.com", password_hash="x")
+    db.session.add(other)
+    reservation = Reservation(user_id=user.user_id, location_id=first.location_id,
+                              slot_id=db.session.scalar(select(ParkingSlot.slot_id)
+                                                        .where(ParkingSlot.location_id == first.location_id)),
+                              vehicle_registration_number="MH12AB1234",
+                              start_time=window[0], end_time=window[1], status="booked")
+    db.session.add(reservation)
+    db.session.commit()
+
+    moved_to = other.user_id, second.location_id
+    reservation.user_id, reservation.location_id = moved_to
+    assert sorted(_tags_for(db.session, reservation, "update")) == sorted([
+        f"user:{user.user_id}", f"user:{other.user_id}",
+        f"lot:{first.location_id}", f"lot:{second.location_id}"])
+
+
+def test_moved_slot_stales_both_lots(make_lot):
+    first, second = make_lot(1, "First"), make_lot(0, "Second")
+    slot = db.session.scalar(select(ParkingSlot).where(ParkingSlot.location_id == first.location_id))
+    moved_to = second.location_id
+    slot.location_id = moved_to
+    assert sorted(_tags_for(db.session, slot, "update")) == sorted([
+        f"lot:{first.location_id}", f"lot:{second.location_id}"])
+
+
+def test_unchanged_reservation_tags_its_own_owner(user, make_lot, window):
+    lot = make_lot(1)
+    reservation = Reservation(user_id=user.user_id, location_id=lot.location_id,
+                              slot_id=db.session.scalar(select(ParkingSlot.slot_id)),
+                              vehicle_registration_number="MH12AB1234",
+                              start_time=window[0], end_time=window[1], status="booked")
+    db.session.add(reservation)
+    db.session.commit()
+    reservation.status = "cancelled"
+    assert sorted(_tags_for(db.session, reservation, "update")) == sorted([
+        f"user:{user.user_id}", f"lot:{lot.location_id}"])
+
+
+def test_remote_lot_bump_drops_the_lot_index(make_lot):
+    from backend import allocation, cache
+    first, second = make_lot(1, "First"), make_lot(1, "Second")
+    allocation.load_indexes([first.location_id, second.location_id])
+
+    cache._own_bumps.add((f"lot:{first.location_id}", 1))
+    cache._received({f"lot:{first.location_id}": 1})
+    assert first.location_id in allocation._indexes      # its own bump
+
+    cache._received({f"lot:{first.location_id}": 2, "lots": 7})
+    assert first.location_id not in allocation._indexes
+    assert second.location_id in allocation._indexes
+
+    cache._notify(None)
+    assert allocation._indexes == {}
+
+
+def test_load_racing_an_invalidation_is_not_kept(make_lot, monkeypatch):
+    from backend import allocation
+    lot = make_lot(1)
+    load = allocation.db.session.query
+
+    def query(*args):
+        allocation.invalidate(lot.location_id)     # a booking lands mid-load
+        return load(*args)
+
+    monkeypatch.setattr(allocation.db.session, "query", query)
+    allocation.load_index(lot.location_id)
+    assert lot.location_id not in allocation._indexes
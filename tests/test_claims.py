@@ -0,0 +1,112 @@
+import threading, time
+from datetime import timedelta
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError
+from backend import app, db
+from backend.allocation import claim_slot, is_overlap
+from backend.migrations import RESERVATION_OVERLAP_CONSTRAINT
+from backend.models import User, ParkingSlot, Reservation
+from conftest import dialect
+
+postgres_only = pytest.mark.skipif(dialect() != "postgresql", reason="needs DATABASE_URL on Postgres")
+
+
+def first_slot(lot):
+    return db.session.scalar(select(ParkingSlot.slot_id).where(ParkingSlot.location_id == lot.location_id))
+
+
+def test_overlapping_claim_is_rejected(user, make_lot, window):
+    lot = make_lot(1)
+    slot_id = first_slot(lot)
+    start, end = window
+
+    assert claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB1234", start, end) is not None
+    db.session.commit()
+
+    overlapping = (start + timedelta(minutes=30), end + timedelta(minutes=30))
+    assert claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB9999", *overlapping) is None
+    # back to back is not an overlap
+    assert claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB9999", end, end + timedelta(hours=1)) is not None
+    db.session.commit()
+
+
+def test_cancelled_reservation_releases_slot(user, make_lot, window):
+    lot = make_lot(1)
+    slot_id = first_slot(lot)
+    reservation_id = claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB1234", *window)
+    db.session.commit()
+
+    db.session.get(Reservation, reservation_id).status = "cancelled"
+    db.session.commit()
+    assert claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB1234", *window) is not None
+
+
+def test_rejected_claim_keeps_the_transaction(user, make_lot, window):
+    lot = make_lot(1)
+    slot_id = first_slot(lot)
+    claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB1234", *window)
+    db.session.commit()
+
+    db.session.get(User, user.user_id).phone = "9999999999"
+    assert claim_slot(user.user_id, lot.location_id, slot_id, "MH12AB9999", *window) is None
+    db.session.commit()
+
+    db.session.expire_all()
+    assert db.session.get(User, user.user_id).phone == "9999999999"
+
+
+@postgres_only
+def test_exclusion_constraint_is_installed():
+    assert db.session.scalar(text("SELECT count(*) FROM pg_constraint WHERE conname = :name"),
+                             {"name": RESERVATION_OVERLAP_CONSTRAINT}) == 1
+
+
+@postgres_only
+def test_constraint_rejects_overlap_written_directly(user, make_lot, window):
+    lot = make_lot(1)
+    row = dict(user_id=user.user_id, location_id=lot.location_id, slot_id=first_slot(lot),
+               vehicle_registration_number="MH12AB1234", start_time=window[0], end_time=window[1],
+               status="booked")
+    db.session.execute(insert(Reservation), [row])
+    with pytest.raises(IntegrityError) as raised:
+        db.session.execute(insert(Reservation), [row])
+    assert is_overlap(raised.value)
+    db.session.rollback()
+
+
+@postgres_only
+def test_concurrent_claim_loses_to_constraint_and_keeps_transaction(user, make_lot, window):
+    """Both claims pass NOT EXISTS under READ COMMITTED; the constraint
+    rejects the second inside its savepoint."""
+    lot = make_lot(1)
+    slot_id = first_slot(lot)
+    user_id, location_id = user.user_id, lot.location_id
+    result = {}
+
+    def second_claim():
+        with app.app_context():
+            try:
+                db.session.get(User, user_id).phone = "8888888888"
+                result["claim"] = claim_slot(user_id, location_id, slot_id, "MH12AB9999", *window)
+                db.session.commit()
+            except Exception as err:
+                result["error"] = err
+            finally:
+                db.session.remove()
+
+    with db.engine.connect() as other:
+        other.execute(insert(Reservation), [dict(
+            user_id=user_id, location_id=location_id, slot_id=slot_id,
+            vehicle_registration_number="MH12AB1234", start_time=window[0], end_time=window[1],
+            status="booked")])
+        claimer = threading.Thread(target=second_claim)
+        claimer.start()
+        time.sleep(0.5)            # the claim is now waiting on the uncommitted row
+        other.commit()
+    claimer.join(10)
+
+    assert "error" not in result
+    assert result["claim"] is None
+    db.session.expire_all()
+    assert db.session.get(User, user_id).phone == "8888888888"
@@ -0,0 +1,23 @@
+import pytest
+from backend import app, push
+
+
+def test_events_stream_requires_login():
+    response = app.test_client().get("/events")
+    assert response.status_code == 401
+
+
+def test_asgi_events_stream_requires_login():
+    pytest.importorskip("aiosqlite")
+    from starlette.testclient import TestClient
+    from backend.asgi import application
+
+    response = TestClient(application).get("/events")
+    assert response.status_code == 401
+
+
+def test_filters_parse_types_and_lots():
+    assert push.filters("slot,metrics", "3,4") == ({"slot", "metrics"}, {3, 4})
+    assert push.filters(None, "") == (None, None)
+    with pytest.raises(ValueError):
+        push.filters("slot", "three")
@@ -0,0 +1,20 @@
+import pytest
+from backend import app
+from backend.common import expand_slot_layout, MAX_LOT_SLOTS
+
+
+def test_layout_expands_levels_and_ranges():
+    slots = expand_slot_layout([{"level": 1, "prefix": "A", "count": 2},
+                                {"from": 5, "to": 6, "covered": True}])
+    assert [slot["slot_number"] for slot in slots] == ["L1-A1", "L1-A2", "S5", "S6"]
+    assert [slot["is_covered"] for slot in slots] == [False, False, True, True]
+
+
+def test_layout_over_the_cap_is_refused_before_expanding():
+    with pytest.raises(ValueError):
+        expand_slot_layout([{"count": MAX_LOT_SLOTS}, {"prefix": "B", "count": 1}])
+
+    response = app.test_client().post("/createlot", json={
+        "name": "Huge", "address_line1": "1 Main Road", "city": "Pune", "country": "India",
+        "hourly_rate": 40, "is_active": True, "layout": [{"count": 10 ** 12}]})
+    assert response.status_code == 400
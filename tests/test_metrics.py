@@ -0,0 +1,77 @@
+import pytest
+from backend import app, metrics
+from backend.models import ParkingLocation, ParkingSlot
+from backend import db
+
+
+@pytest.fixture
+def counters(fake_redis):
+    redis = metrics.redis_client
+    metrics.reconcile()
+    return lambda: {name: int(value) for name, value in redis.hgetall(metrics.METRICS_KEY).items()
+                    if name != "reconciled_at"}
+
+
+def test_orm_lot_counts_each_slot_once(counters):
+    lot = ParkingLocation(name="Seeded", address_line1="1 Main Road", city="Pune",
+                          country="India", hourly_rate=40, total_slots=3)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.add_all([ParkingSlot(location_id=lot.location_id, slot_number=f"S{i}") for i in range(3)])
+    db.session.commit()
+
+    assert counters()["total_slots"] == 3
+    assert counters() == metrics.compute()
+
+
+def test_createlot_bulk_insert_counts_its_slots(counters):
+    response = app.test_client().post("/createlot", json={
+        "name": "Bulk", "address_line1": "2 Main Road", "city": "Pune", "country": "India",
+        "hourly_rate": 40, "is_active": True, "total_slots": 5})
+    assert response.status_code == 200
+    assert counters()["total_slots"] == 5
+
+
+def test_editing_total_slots_column_changes_nothing(counters):
+    lot = ParkingLocation(name="Edited", address_line1="3 Main Road", city="Pune",
+                          country="India", hourly_rate=40, total_slots=2)
+    db.session.add(lot)
+    db.session.commit()
+    lot.total_slots = 50
+    db.session.commit()
+    assert counters() == metrics.compute()
+
+
+def test_reconcile_corrects_drift_with_increments(counters, monkeypatch):
+    published = []
+    monkeypatch.setattr(metrics, "publish", lambda kind, data: published.append((kind, data)))
+    metrics.redis_client.hset(metrics.METRICS_KEY, "total_users", 99)
+    assert metrics.reconcile() == {"total_users": 99}
+    assert counters() == metrics.compute()
+    assert published == [("metrics", {"total_users": -99})]     # live dashboards follow it
+
+
+def test_reconcile_recounts_when_a_delta_lands_meanwhile(counters, user, monkeypatch):
+    compute = metrics.compute
+    calls = []
+
+    def racing_compute(session=None):
+        calls.append(1)
+        if len(calls) == 1:
+            # a commit's hook runs while the tables are being counted
+            metrics.redis_client.hincrby(metrics.METRICS_KEY, "total_users", 1)
+        return compute(session)
+
+    monkeypatch.setattr(metrics, "compute", racing_compute)
+    metrics.reconcile()
+    assert len(calls) == 2
+    assert counters()["total_users"] == 1
+
+
+def test_admin_metrics_formats_the_counters(counters):
+    metrics.redis_client.hset(metrics.METRICS_KEY, mapping={
+        "total_revenue_cents": 12345, "total_slots": 10, "occupied_slots": 4})
+    formatted = metrics.admin_metrics()
+    assert formatted == metrics.format_metrics(metrics.redis_client.hgetall(metrics.METRICS_KEY))
+    assert formatted["total_revenue"] == 123.45
+    assert formatted["available_slots"] == 6
@@ -0,0 +1,53 @@
+from sqlalchemy import select
+from backend import db, occupancy
+from backend.models import ParkingSlot, Reservation
+
+
+def book(user, lot, window, status):
+    reservation = Reservation(user_id=user.user_id, location_id=lot.location_id,
+                              slot_id=db.session.scalar(select(ParkingSlot.slot_id)
+                                                        .where(ParkingSlot.location_id == lot.location_id)),
+                              vehicle_registration_number="MH12AB1234",
+                              start_time=window[0], end_time=window[1], status=status)
+    db.session.add(reservation)
+    db.session.commit()
+    return reservation
+
+
+def test_refresh_flips_the_bit(fake_redis, user, make_lot, window):
+    lot = make_lot(2)
+    occupancy.load(lot.location_id)
+    book(user, lot, window, occupancy.OCCUPIED_STATUS)
+
+    layout, bitmap = occupancy.snapshot([lot.location_id])[lot.location_id]
+    assert occupancy.is_set(bitmap, 0) and not occupancy.is_set(bitmap, 1)
+
+
+def test_load_that_raced_a_change_is_not_stored(fake_redis, user, make_lot, window, monkeypatch):
+    lot = make_lot(1)
+    build = occupancy._build
+
+    def racing_build(location_id):
+        built = build(location_id)
+        book(user, lot, window, occupancy.OCCUPIED_STATUS)    # its refresh bumps the lot
+        return built
+
+    monkeypatch.setattr(occupancy, "_build", racing_build)
+    layout, bitmap = occupancy.load(lot.location_id)
+    assert not occupancy.is_set(bitmap, 0)                     # what this request saw
+    assert occupancy.redis_client.get(occupancy.layout_key(lot.location_id)) is None
+
+    monkeypatch.setattr(occupancy, "_build", build)
+    layout, bitmap = occupancy.snapshot([lot.location_id])[lot.location_id]
+    assert occupancy.is_set(bitmap, 0)
+
+
+def test_overtaken_refresh_drops_the_lot(fake_redis, make_lot):
+    lot = make_lot(1)
+    occupancy.load(lot.location_id)
+    older = occupancy._bump([lot.location_id])[lot.location_id]
+    newer = occupancy._bump([lot.location_id])[lot.location_id]
+
+    assert occupancy._write_bits(lot.location_id, older, [(0, 1)]) is None
+    assert occupancy.redis_client.get(occupancy.layout_key(lot.location_id)) is None
+    assert occupancy._write_bits(lot.location_id, newer, [(0, 1)]) is None    # dropping bumped it too
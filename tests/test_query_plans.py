@@ -0,0 +1,139 @@
+"""EXPLAIN QUERY PLAN checks that the routes' queries stay on their indexes.
+
+Each route is called through the test client while a before_cursor_execute
+listener records the SQL it actually sends; every recorded statement is then
+explained. A route whose query starts scanning a whole table (a dropped
+index, a rewritten filter the index no longer matches) fails here instead of
+in production. The few scans a route is meant to do, such as listing every
+lot, are allowed per route below.
+"""
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from backend import app, db
+from backend.auth import issue_token
+from backend.models import User, OTP, ParkingLocation, ParkingSlot, Reservation, Payment, Review
+from conftest import dialect
+
+pytestmark = pytest.mark.skipif(dialect() != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite's")
+
+START = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+END = START + timedelta(hours=2)
+
+# statements that read or write rows; PRAGMAs, DDL and the like are not explained
+EXPLAINABLE = re.compile(r"\s*(SELECT|WITH|UPDATE|DELETE|INSERT\s+INTO\s+\w+\s*\([^)]*\)\s*SELECT)", re.I)
+
+
+@pytest.fixture
+def world(fake_redis):
+    """One user with a paid and an unpaid booking, a review and an OTP, on a three-slot lot."""
+    user = User(username="planner", email="planner@gmail.com", first_name="Plan",
+                password_hash=generate_password_hash("secret"))
+    lot = ParkingLocation(name="Plan Lot", address_line1="1 Main Road", city="Pune",
+                          country="India", hourly_rate=40, total_slots=3, is_active=True)
+    db.session.add_all([user, lot])
+    db.session.flush()
+    slots = [ParkingSlot(location_id=lot.location_id, slot_number=f"S{i}") for i in range(1, 4)]
+    db.session.add_all(slots)
+    db.session.flush()
+    reservation, unpaid = [Reservation(user_id=user.user_id, location_id=lot.location_id, slot_id=slot.slot_id,
+                                       vehicle_registration_number="MH12AB1234", start_time=START, end_time=END)
+                           for slot in slots[:2]]
+    db.session.add_all([reservation, unpaid,
+                        Review(user_id=user.user_id, location_id=lot.location_id, rating=5,
+                               review_text="Easy parking near the station"),
+                        OTP(user_id=user.user_id, otp_code="1234")])
+    db.session.flush()
+    db.session.add(Payment(reservation_id=reservation.reservation_id, amount=80,
+                           payment_method="card", payment_status="paid"))
+    db.session.commit()
+    return {"user_id": user.user_id, "location_id": lot.location_id,
+            "unpaid_reservation_id": unpaid.reservation_id}
+
+
+def requests(world):
+    """(method, url, json body, tables the route may read in full, and why)."""
+    window = {"start_time": START.isoformat(), "end_time": END.isoformat()}
+    lot_id = world["location_id"]
+    return [
+        ("POST", "/login", {"email": "planner@gmail.com", "password": "secret"}, {}),
+        ("POST", "/verify-otp", {"email": "planner@gmail.com", "otp": "1234"}, {}),
+        ("POST", "/reserve", {"name": "Plan Lot", "vehicle_registration_number": "MH12AB1234",
+                              **window}, {}),
+        ("PUT", "/reserve", {"location_name": "Plan Lot", "new_status": "occupied"}, {}),
+        ("GET", "/get-reviews?limit=5", None,
+         {"reviews": "newest first: walks the primary key backwards and stops at the limit"}),
+        ("GET", "/get-reviews?after=100&limit=5", None, {}),
+        ("GET", "/search/reviews?q=parking", None, {}),
+        ("GET", "/search/locations?q=plan", None, {}),
+        ("GET", "/userdashboard", None, {}),
+        ("GET", "/userupcomingbookings", None, {}),
+        ("POST", "/payment", {"reservation_id": world["unpaid_reservation_id"], "amount": 80,
+                              "payment_method": "card", "payment_status": "paid"}, {}),
+        ("POST", "/createlot", {"name": "New Lot", "address_line1": "2 Main Road", "city": "Pune",
+                                "country": "India", "hourly_rate": 40, "is_active": True,
+                                "layout": [{"count": 3}]}, {}),
+        ("PUT", "/editlot", {"lot_id": lot_id, "hourly_rate": 50}, {}),
+        ("POST", "/deletelot", {"name": "Plan Lot"}, {}),
+        ("GET", "/getlot", None, {"parking_locations": "lists every lot"}),
+        ("GET", f"/search/availability?city=Pune&start_time={START.isoformat()}&end_time={END.isoformat()}",
+         None, {"parking_locations": "the lot list it filters is every lot (cached)"}),
+        ("GET", f"/lots/{lot_id}/availability", None, {}),
+        ("GET", "/getusers?limit=10", None,
+         {"users": "first keyset page: walks the primary key and stops at the limit"}),
+        ("GET", "/getusers?after=0&limit=10&q=plan", None, {}),
+        ("GET", "/getreservations?after=0&limit=10", None, {}),
+        ("GET", "/admindashboard", None,
+         {"parking_locations": "reconciling a missing counters hash counts the active lots",
+          "payments": "reconciling a missing counters hash sums every payment"}),
+        ("GET", "/lotstats?city=Pune", None, {}),
+        ("GET", "/userstats", None,
+         {"users": "counts every user"}),
+        ("GET", "/financialstats", None,
+         {"daily_payment_method_stats": "sums every day's rollup"}),
+    ]
+
+
+def captured(client, method, url, body):
+    """The explainable statements (with their parameters) a request sends."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and EXPLAINABLE.match(statement):
+            statements.append((statement, parameters))
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.open(url, method=method, json=body)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+    assert response.status_code < 500, f"{method} {url}: {response.get_data(as_text=True)}"
+    return statements
+
+
+def full_scans(statement, parameters):
+    """Tables the statement reads in full: SQLite reports those as a bare
+    'SCAN <table>' (subqueries and virtual tables say more)."""
+    with db.engine.connect() as conn:
+        details = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    return {match.group(1) for d in details if (match := re.fullmatch(r"SCAN (\w+)", d))
+            and match.group(1) in db.metadata.tables}
+
+
+def test_routes_do_not_scan_whole_tables(world):
+    client = app.test_client()
+    with app.app_context():
+        client.set_cookie("token", issue_token(world["user_id"]))
+
+    failures = []
+    for method, url, body, allowed in requests(world):
+        for statement, parameters in captured(client, method, url, body):
+            scanned = full_scans(statement, parameters) - set(allowed)
+            if scanned:
+                failures.append(f"{method} {url} scans {', '.join(sorted(scanned))}:\n    {statement}")
+    assert not failures, "\n".join(failures)
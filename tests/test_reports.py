@@ -0,0 +1,24 @@
+import pytest
+from backend.tasks import user_report
+
+
+@pytest.fixture
+def jobs(fake_redis):
+    return user_report.redis_client
+
+
+def test_finished_job_clears_its_dedupe_key(jobs, user, monkeypatch):
+    monkeypatch.setattr(user_report, "get_report", lambda user: "/reports/report.pdf")
+    jobs.set(user_report.job_key("job-1"), 1)
+    assert user_report.build_user_report.apply(args=[user.user_id], task_id="job-1").get() == "report.pdf"
+    assert not jobs.exists(user_report.job_key("job-1"))
+
+
+def test_failed_job_clears_its_dedupe_key(jobs, user, monkeypatch):
+    def fail(user):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(user_report, "get_report", fail)
+    jobs.set(user_report.job_key("job-2"), 1)
+    assert user_report.build_user_report.apply(args=[user.user_id], task_id="job-2").failed()
+    assert not jobs.exists(user_report.job_key("job-2"))
@@ -0,0 +1,49 @@
+from backend import storage
+
+
+class Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class Connection:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        return Result(self.lag)
+
+
+class Dialect:
+    name = "postgresql"
+
+
+class Replica:
+    """A Postgres replica engine whose pg_last_xact_replay_timestamp() lag is `lag`."""
+    dialect = Dialect()
+
+    def __init__(self, lag):
+        self.lag = lag
+
+    def connect(self):
+        return Connection(self.lag)
+
+
+def test_postgres_replica_without_replay_timestamp_is_stale(monkeypatch):
+    monkeypatch.setattr(storage, "SNAPSHOT_REPLICA", False)
+    assert storage._replica_as_of(Replica(None)) is None
+
+
+def test_postgres_replica_lag_is_measured(monkeypatch):
+    monkeypatch.setattr(storage, "SNAPSHOT_REPLICA", False)
+    as_of = storage._replica_as_of(Replica(12.5))
+    assert abs(storage.time.time() - 12.5 - as_of) < 1